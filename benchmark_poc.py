@@ -0,0 +1,352 @@
+"""
+Benchmark for the generate_poc pipeline.
+
+Builds synthetic datasheets shaped like Datasheet-HS.xlsx at several sizes and a
+reference template, then runs generate_poc.main on each with Gemini and
+Wikipedia stubbed out (no network, no API key). Every case runs in a fresh
+process so peak RSS is per case.
+
+    python benchmark_poc.py                          # all cases, print results
+    python benchmark_poc.py --cases small --repeat 5
+    python benchmark_poc.py --save-baseline bench_baseline.json
+    python benchmark_poc.py --compare bench_baseline.json
+    python benchmark_poc.py --xlsx-backends            # datasheet extraction: XML reader vs openpyxl
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# name -> (segments per By_* sheet, TOC lines, companies)
+CASES = {
+    "small": (3, 40, 5),
+    "medium": (6, 200, 30),
+    "large": (8, 600, 100),
+}
+
+# --xlsx-backends workbook: (segments, TOC lines, companies, extra Company_Name columns)
+XLSX_CASE = (8, 20000, 20000, 12)
+
+SEGMENT_SHEETS = {
+    "By_Type": ("Physical Form", "Type"),
+    "By_Application": ("Application", "Source"),
+    "By_EndUser": ("End Use Industry", "End User Industry"),
+    "By_Region": ("Region", "Region"),
+}
+
+HIST_YEARS = list(range(2019, 2025))
+FCST_YEARS = list(range(2025, 2034))
+
+# --------------- synthetic inputs ---------------
+
+def make_datasheet(path, segments, toc_lines, companies, seed=0, extra_columns=0):
+    """
+    Write a workbook with the same sheets/blocks generate_poc reads from
+    Datasheet-HS.xlsx. extra_columns pads Company_Name with columns the
+    generator never reads (the real sheet has notes next to the names).
+    """
+    import openpyxl
+
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Summary"
+    for row in (["Key", "Value"], ["Title", "Testland Widget Market"], ["Period", "2019–2033"],
+                ["Unit", "Thousand Tons"], ["Unit %", "Volume Share (in %)"]):
+        ws.append(row)
+
+    ws = wb.create_sheet("Table_Contents")
+    chapter = section = 0
+    for i in range(toc_lines):
+        if i % 8 == 0:
+            chapter += 1
+            section = 0
+            ws.append([f"{chapter} \xa0 Chapter {chapter}"])
+        else:
+            section += 1
+            ws.append([f"\xa0 \xa0 {chapter}.{section} \xa0 \xa0Section {chapter}.{section}"])
+
+    ws = wb.create_sheet("Sales_Forecast")
+    ws.append(["Year", "Sales Volume (in Thousand Tons)", "CAGR 2019–2024 (%)", "CAGR 2025–2033 (%)"])
+    total = {}
+    volume = 1000.0
+    for year in HIST_YEARS + FCST_YEARS:
+        volume *= 1 + rng.uniform(-0.05, 0.08)
+        total[year] = volume
+        ws.append([year, volume, None, None])
+    ws.cell(7, 3).value = (total[2024] / total[2019]) ** (1 / 5) - 1
+    ws.cell(16, 4).value = (total[2033] / total[2025]) ** (1 / 8) - 1
+
+    ws = wb.create_sheet("Company_Name")
+    ws.append(["Company Names"])
+    for i in range(companies):
+        ws.append([f"Synthetic Chemicals {i + 1} Co., Ltd."] + [f"note {i}.{j}" for j in range(extra_columns)])
+
+    for sheet_name, (title, label) in SEGMENT_SHEETS.items():
+        ws = wb.create_sheet(sheet_name)
+        weights = [rng.uniform(1, 10) for _ in range(segments)]
+        shares = [w / sum(weights) for w in weights]
+        names = [f"{label} {chr(65 + i)}" for i in range(segments - 1)] + ["Others"]
+        header = [label] + HIST_YEARS + ["CAGR (2019–2024%)"] + FCST_YEARS + ["CAGR (2025–2033%)"]
+
+        ws.append([f"Market Breakup By {title}: Sales Volume (in Thousand Tons)"])
+        ws.append(header)
+        for name, share in zip(names, shares):
+            values = [total[y] * share for y in HIST_YEARS + FCST_YEARS]
+            ws.append([name] + values[:6] + [None] + values[6:] + [None])
+        ws.append(["Total "] + [total[y] for y in HIST_YEARS] + [None] + [total[y] for y in FCST_YEARS] + [None])
+
+        ws.append([f"Market Breakup By {title}: Volume Share (in %)"])
+        ws.append([label] + [f"{y} (%)" for y in HIST_YEARS] + ["CAGR (2019–2024%)"]
+                  + [f"{y} (%)" for y in FCST_YEARS] + ["CAGR (2025–2033%)"])
+        for name, share in zip(names, shares):
+            ws.append([name] + [share] * 6 + [None] + [share] * 9 + [None])
+        ws.append(["Total "] + [1] * 6 + [None] + [1] * 9 + [None])
+
+    wb.save(path)
+
+def make_reference_template(path):
+    """A template exercising every placeholder kind main() handles."""
+    from pptx import Presentation
+    from pptx.chart.data import CategoryChartData
+    from pptx.enum.chart import XL_CHART_TYPE
+    from pptx.util import Inches, Pt
+
+    prs = Presentation()
+    blank = prs.slide_layouts[6]
+
+    def textbox(slide, paragraphs, top=1.0, left=0.5, width=9.0, height=1.0):
+        tf = slide.shapes.add_textbox(Inches(left), Inches(top), Inches(width), Inches(height)).text_frame
+        for i, text in enumerate(paragraphs):
+            p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
+            run = p.add_run()
+            run.text = text
+            run.font.size = Pt(12)
+
+    def table(slide, rows, cols, cells, top=1.0):
+        tbl = slide.shapes.add_table(rows, cols, Inches(0.5), Inches(top), Inches(9), Inches(0.4 * rows)).table
+        for (r, c), text in cells.items():
+            tbl.cell(r, c).text = text
+
+    s = prs.slides.add_slide(blank)
+    textbox(s, ["{{Title}}", "{{Subtitle}}", "{{Country}} / {{Product}} / {{Unit}}"])
+    s = prs.slides.add_slide(blank)
+    textbox(s, ["{{Market_Intro_Line}}", "{{Market_Outlook_Line}}",
+                "Types: {{By_Type_Inline}}; applications: {{By_Application_Inline}}",
+                "{{Top_Type}} {{Top_Type_Share}}%, {{Second_Application}} {{Second_Application_Share}}%",
+                "{{Top_Region_1}} {{Top_Region_1_Share}}%, {{Top_EndUser}} {{Top_EndUser_Share}}%"])
+    s = prs.slides.add_slide(blank)
+    textbox(s, ["{{By_Type_List}}"], top=1)
+    textbox(s, ["{{By_Region_List}}"], top=4)
+    s = prs.slides.add_slide(blank)
+    for i in range(3):
+        textbox(s, ["{{By_EndUser_List}}"], top=1 + i, width=3)
+    s = prs.slides.add_slide(blank)
+    table(s, 2, 5, {(0, 0): "Segment", (0, 1): "Unit", (0, 2): "2024", (0, 3): "2033", (0, 4): "CAGR",
+                    (1, 0): "{{By_Application_List_EXPAND}}", (1, 1): "{{Unit}}"})
+    s = prs.slides.add_slide(blank)
+    textbox(s, ["{{Table_Contents_Left}}"], left=0.5, width=4, height=6)
+    textbox(s, ["{{Table_Contents_Right}}"], left=5, width=4, height=6)
+    s = prs.slides.add_slide(blank)
+    for left, years in ((0.5, HIST_YEARS), (5, FCST_YEARS)):
+        data = CategoryChartData()
+        data.categories = [str(y) for y in years]
+        data.add_series("Volume", [1] * len(years))
+        s.shapes.add_chart(XL_CHART_TYPE.COLUMN_CLUSTERED, Inches(left), Inches(1), Inches(4), Inches(3), data)
+    s = prs.slides.add_slide(blank)
+    textbox(s, ["{{Market_Overview_Content}}"], top=1, height=3)
+    textbox(s, ["{{Overview_AI_Content}}"], top=4, height=3)
+    s = prs.slides.add_slide(blank)
+    table(s, 6, 5, {(0, 0): "Company", (0, 1): "Founded", (0, 2): "Headquarters", (0, 3): "Website",
+                    (0, 4): "Products", (1, 0): "{{Company_Name_List}}"})
+    prs.save(path)
+
+# --------------- stubbed run (inside a fresh process) ---------------
+
+def _install_stubs():
+    """Offline Gemini (FakeGenerativeModel) and an in-process Wikipedia client."""
+    os.environ["GENAI_FAKE"] = "1"
+    os.environ["GENAI_FAKE_DELAY"] = "0"
+    os.environ["PPT_CRAFTER_CACHE_DB"] = ""        # measure the full pipeline every run
+    os.environ["GEMINI_MAX_RPS"] = "0"
+    os.environ["WIKIPEDIA_MAX_RPS"] = "0"
+    os.environ["INCREMENTAL_REGEN"] = "0"
+
+    import generate_poc
+
+    class StubWikipediaClient(generate_poc.WikipediaClient):
+        def _query(self, params, timeout):
+            if params.get("list") == "search":
+                return {"search": [{"title": params["srsearch"]}]}
+            pages = {}
+            for i, title in enumerate(params["titles"].split("|")):
+                pages[str(i)] = {"title": title, "extract": f"{title} was founded in {1900 + len(title)}."}
+            return {"pages": pages}
+
+    generate_poc.set_wikipedia_client(StubWikipediaClient(api_url="http://stub.invalid"))
+    return generate_poc
+
+def run_case(excel_path, template_path, output_path, repeat):
+    """Run main() repeat times; median total/stage seconds, peak RSS (KiB), output bytes."""
+    import contextlib
+    import io
+    import resource
+
+    generate_poc = _install_stubs()
+
+    runs = []
+    for _ in range(repeat):
+        metrics = generate_poc.PipelineMetrics()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_poc.main(excel_path, template_path, output_path, metrics=metrics)
+        runs.append(metrics)
+
+    stage_names = list(dict.fromkeys(name for metrics in runs for name in metrics.stages))
+    return {
+        "total_s": statistics.median(metrics.total for metrics in runs),
+        "stages_s": {name: statistics.median(metrics.stages.get(name, 0.0) for metrics in runs)
+                     for name in stage_names},
+        "counts": runs[-1].counts,
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "output_bytes": os.path.getsize(output_path),
+    }
+
+# --------------- XLSX backends ---------------
+
+def run_extraction(excel_path, backend, repeat):
+    """Time every workbook extractor of main() (AI sections off) with one WorkbookContext backend."""
+    import contextlib
+    import io
+    import tracemalloc
+
+    generate_poc = _install_stubs()
+
+    def extract():
+        with contextlib.redirect_stdout(io.StringIO()):
+            with generate_poc.WorkbookContext(excel_path, backend=backend) as wb:
+                generate_poc.read_summary_keys(wb, "Summary")
+                generate_poc.extract_dynamic_placeholders(wb, include_market_overview=False,
+                                                          include_overview_content=False)
+                generate_poc.build_report_subtitle(wb)
+                for sheet_name in wb.sheetnames:
+                    if sheet_name.startswith("By_"):
+                        generate_poc.build_list_from_sheet(wb, sheet_name)
+                generate_poc.build_toc_from_sheet(wb, "Table_Contents")
+                generate_poc.build_list_from_sheet(wb, "Company_Name")
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract()
+        times.append(time.perf_counter() - started)
+    # allocation peak from one extra, untimed run (tracing slows everything down)
+    tracemalloc.start()
+    extract()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"total_s": statistics.median(times), "peak_alloc_kib": peak // 1024}
+
+def run_xlsx_benchmark(repeat, workdir):
+    segments, toc_lines, companies, extra_columns = XLSX_CASE
+    excel_path = os.path.join(workdir, "xlsx_large.xlsx")
+    make_datasheet(excel_path, segments, toc_lines, companies, extra_columns=extra_columns)
+    print(f"Workbook: {toc_lines} TOC lines, {companies} companies x {extra_columns + 1} columns,"
+          f" {os.path.getsize(excel_path) / 1024:.0f} KiB")
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for backend in ("openpyxl", "xml"):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            results[backend] = pool.submit(run_extraction, excel_path, backend, repeat).result()
+        result = results[backend]
+        print(f"{backend:>9}: extraction {result['total_s'] * 1000:.0f}ms"
+              f" | peak allocated {result['peak_alloc_kib'] / 1024:.1f} MiB")
+    speedup = results["openpyxl"]["total_s"] / results["xml"]["total_s"]
+    print(f"XML reader: {speedup:.1f}x the openpyxl extraction speed")
+    return results
+
+# --------------- driver ---------------
+
+def run_benchmarks(case_names, repeat, workdir):
+    template_path = os.path.join(workdir, "reference_template.pptx")
+    make_reference_template(template_path)
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for name in case_names:
+        segments, toc_lines, companies = CASES[name]
+        excel_path = os.path.join(workdir, f"{name}.xlsx")
+        make_datasheet(excel_path, segments, toc_lines, companies, seed=len(name))
+        output_path = os.path.join(workdir, f"{name}.pptx")
+        # a fresh interpreter per case keeps peak RSS comparable across cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(run_case, excel_path, template_path, output_path, repeat).result()
+        result["shape"] = {"segments": segments, "toc_lines": toc_lines, "companies": companies}
+        results[name] = result
+        print_case(name, result)
+    return results
+
+def print_case(name, result):
+    stages = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in result["stages_s"].items())
+    print(f"{name:>7}: total {result['total_s'] * 1000:.0f}ms | peak RSS {result['peak_rss_kib'] / 1024:.1f} MiB"
+          f" | output {result['output_bytes'] / 1024:.1f} KiB")
+    print(f"         {stages}")
+
+def compare(results, baseline):
+    print("\nChange vs baseline (positive = slower/bigger):")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:>7}: no baseline")
+            continue
+        deltas = []
+        for label, key in (("time", "total_s"), ("rss", "peak_rss_kib"), ("size", "output_bytes")):
+            if base.get(key):
+                deltas.append(f"{label} {(result[key] - base[key]) / base[key] * 100:+.1f}%")
+        print(f"{name:>7}: " + ", ".join(deltas))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generate_poc.main on synthetic datasheets.")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the median is reported")
+    parser.add_argument("--save-baseline", metavar="FILE", help="write results to FILE for later --compare")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--keep", metavar="DIR", help="keep generated inputs/outputs in DIR")
+    parser.add_argument("--xlsx-backends", action="store_true",
+                        help="only compare datasheet extraction with the XML reader and openpyxl on a large workbook")
+    args = parser.parse_args(argv)
+
+    if args.xlsx_backends:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as workdir:
+            run_xlsx_benchmark(args.repeat, args.keep or workdir)
+        return
+
+    case_names = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in case_names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+        results = run_benchmarks(case_names, args.repeat, args.keep)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_benchmarks(case_names, args.repeat, workdir)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": args.repeat, "results": results},
+                      f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,34 @@
 import openpyxl
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_ISO8601, from_excel
 from pptx import Presentation
 from pptx.dml.color import RGBColor
 from pptx.util import Inches, Pt
 from copy import deepcopy
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+import base64
+import hashlib
+import io
 import math
+import sqlite3
+import sys
+import tempfile
+import threading
+import posixpath
+import time
+import zipfile
+from lxml import etree
+from pptx.oxml import parse_xml
 from pptx.oxml.ns import qn
 import requests, re, json, datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pptx.chart.data import CategoryChartData
 from pptx.enum.chart import XL_CHART_TYPE
 from pptx.util import Emu
 import google.generativeai as genai
+import numpy as np
 import os
 
 # setup Gemini
@@ -21,14 +40,894 @@ else:
     # but parts of the script that call AI will likely throw or return empty strings.
     print("⚠️ GENAI_API_KEY not set. AI features will fail if used.")
 
+# --------------- workbook access ---------------
+
+# "xml": read sheet values straight from the .xlsx parts (XlsxXmlReader), falling
+# back to openpyxl for anything it can't read; "openpyxl": always use openpyxl
+XLSX_BACKEND = os.environ.get("XLSX_BACKEND", "xml")
+
+_SML_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+def _xml_text(node):
+    """Plain text of a string item (<si>/<is>): its <t> plus rich-text run <t>s, like openpyxl."""
+    parts = [node.findtext(f"{{{_SML_NS}}}t") or ""]
+    parts.extend(r.findtext(f"{{{_SML_NS}}}t") or "" for r in node.iterfind(f"{{{_SML_NS}}}r"))
+    return "".join(parts)
+
+def _cast_number(text):
+    return float(text) if "." in text or "E" in text or "e" in text else int(text)
+
+_column_indexes = {}
+
+def _column_index(ref):
+    """1-based column of a cell reference such as "AB12"."""
+    letters = ref.rstrip("0123456789")
+    col = _column_indexes.get(letters)
+    if col is None:
+        col = 0
+        for ch in letters.upper():
+            col = col * 26 + ord(ch) - 64
+        _column_indexes[letters] = col
+    return col
+
+class XlsxXmlReader:
+    """
+    Cached cell values of an .xlsx read straight from the zip: worksheet parts
+    are streamed with lxml iterparse and only values are kept, no cell/style
+    objects. Rows come out as openpyxl read-only mode would give them
+    (values_only, data_only): same number conversion, shared/inline strings,
+    date-formatted numbers as datetimes, gaps filled with None, and rows
+    padded to a uniform width like a full-mode load. Raises on anything it doesn't know,
+    so callers can fall back to openpyxl.
+    """
+
+    def __init__(self, source):
+        self._zip = zipfile.ZipFile(source)
+        try:
+            workbook_part = self._relationship_targets("", "_rels/.rels", "/officeDocument")[0]
+            base = posixpath.dirname(workbook_part)
+            rels_part = posixpath.join(base, "_rels", posixpath.basename(workbook_part) + ".rels")
+            rels = self._relationships(base, rels_part)
+
+            workbook = etree.fromstring(self._zip.read(workbook_part))
+            pr = workbook.find(f"{{{_SML_NS}}}workbookPr")
+            self.epoch = CALENDAR_MAC_1904 if pr is not None and pr.get("date1904") in ("1", "true") \
+                else CALENDAR_WINDOWS_1900
+            self._sheet_parts = OrderedDict()
+            for sheet in workbook.iterfind(f"{{{_SML_NS}}}sheets/{{{_SML_NS}}}sheet"):
+                self._sheet_parts[sheet.get("name")] = rels[sheet.get(f"{{{_REL_NS}}}id")][1]
+            if not self._sheet_parts:
+                # e.g. Strict OOXML, which uses other namespaces
+                raise ValueError("no worksheets found")
+            self.sheetnames = list(self._sheet_parts)
+
+            by_type = {rel_type.rsplit("/", 1)[-1]: target for rel_type, target in rels.values()}
+            self._shared_strings = self._read_shared_strings(by_type.get("sharedStrings"))
+            self._date_styles, self._timedelta_styles = self._read_date_styles(by_type.get("styles"))
+        except Exception:
+            self._zip.close()
+            raise
+
+    def close(self):
+        self._zip.close()
+
+    def _relationships(self, base, rels_part):
+        """{rId: (type, part name)} of a .rels part; targets resolved against base."""
+        rels = {}
+        root = etree.fromstring(self._zip.read(rels_part))
+        for rel in root.iterfind(f"{{{_PKG_REL_NS}}}Relationship"):
+            target = rel.get("Target")
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+            rels[rel.get("Id")] = (rel.get("Type"), target)
+        return rels
+
+    def _relationship_targets(self, base, rels_part, type_suffix):
+        return [target for rel_type, target in self._relationships(base, rels_part).values()
+                if rel_type.endswith(type_suffix)]
+
+    def _read_shared_strings(self, part):
+        if not part or part not in self._zip.namelist():
+            return []
+        strings = []
+        with self._zip.open(part) as f:
+            for _, node in etree.iterparse(f, tag=f"{{{_SML_NS}}}si"):
+                strings.append(_xml_text(node).replace("x005F_", ""))
+                node.clear()
+        return strings
+
+    def _read_date_styles(self, part):
+        """Indexes of the cell formats (s="...") that show dates / durations."""
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+
+        if not part or part not in self._zip.namelist():
+            return set(), set()
+        root = etree.fromstring(self._zip.read(part))
+        custom = {int(fmt.get("numFmtId")): fmt.get("formatCode")
+                  for fmt in root.iterfind(f"{{{_SML_NS}}}numFmts/{{{_SML_NS}}}numFmt")}
+        dates, timedeltas = set(), set()
+        for idx, xf in enumerate(root.iterfind(f"{{{_SML_NS}}}cellXfs/{{{_SML_NS}}}xf")):
+            num_fmt_id = int(xf.get("numFmtId", 0))
+            fmt = custom.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id))
+            if fmt and is_date_format(fmt):
+                dates.add(idx)
+            if fmt and is_timedelta_format(fmt):
+                timedeltas.add(idx)
+        return dates, timedeltas
+
+    def _cell_value(self, c):
+        data_type = c.get("t", "n")
+        if data_type == "inlineStr":
+            inline = c.find(f"{{{_SML_NS}}}is")
+            return _xml_text(inline) if inline is not None else None
+        value = c.findtext(f"{{{_SML_NS}}}v") or None
+        if value is None:
+            return None
+        if data_type == "n":
+            value = _cast_number(value)
+            style = int(c.get("s") or 0)
+            if style in self._date_styles:
+                try:
+                    return from_excel(value, self.epoch, timedelta=style in self._timedelta_styles)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == "s":
+            return self._shared_strings[int(value)]
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "d":
+            return from_ISO8601(value)
+        return value    # "str" (formula result) and "e" (error) stay text
+
+    def iter_rows(self, sheet_name, max_col=None):
+        """
+        Value tuples of a sheet from row 1, holding columns 1..max_col (default:
+        the widest row). Rows run to the last <row> holding cells; the stored
+        <dimension> is not trusted since writers often leave it stale.
+        """
+        row_tag, cell_tag = f"{{{_SML_NS}}}row", f"{{{_SML_NS}}}c"
+        values = {}   # row index -> {col: value}
+        width = last_row = row_idx = 0
+        with self._zip.open(self._sheet_parts[sheet_name]) as f:
+            for _, node in etree.iterparse(f, tag=row_tag):
+                idx = int(node.get("r")) if node.get("r") else row_idx + 1
+                cells = {}
+                col = 0
+                for c in node:
+                    if c.tag != cell_tag:
+                        continue
+                    ref = c.get("r")
+                    col = _column_index(ref) if ref else col + 1
+                    last_row = idx
+                    if max_col is not None and col > max_col:
+                        break   # cells are stored left to right
+                    width = max(width, col)
+                    cells[col] = self._cell_value(c)
+                values[idx] = cells
+                row_idx = idx
+                # drop parsed rows as we go: only values are kept
+                node.clear()
+                while node.getprevious() is not None:
+                    del node.getparent()[0]
+        width = max_col or width
+        for idx in range(1, last_row + 1):
+            cells = values.get(idx, {})
+            yield tuple(cells.get(i) for i in range(1, width + 1))
+
+class WorkbookContext:
+    """
+    Parse an Excel datasheet once (read-only, cached values) and share it
+    across every extractor of a run.
+
+    Sheets are materialized lazily the first time they are asked for and kept
+    as plain value tuples, so repeated lookups never go back to openpyxl.
+    Only the columns declared in SHEET_COLUMNS are kept for a sheet; a read
+    past them re-reads that sheet wider, so declarations only affect memory.
+    Values come from XlsxXmlReader (backend "xml", see XLSX_BACKEND) and from
+    openpyxl read-only mode if that fails or backend is "openpyxl".
+    Accepts a path, bytes, a file-like object or an already loaded openpyxl workbook.
+    """
+
+    # Columns the extractors read per sheet (1-based, from column A); sheets not
+    # listed, e.g. the By_* segmentation sheets, are read in full
+    SHEET_COLUMNS = {
+        "Summary": 2,           # key, value
+        "Sales_Forecast": 4,    # year, volume, historical CAGR (C7), forecast CAGR (D16)
+        "Table_Contents": 1,
+        "Company_Name": 1,
+    }
+
+    def __init__(self, source, backend=None):
+        self.source = source
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self._source = source
+        self._xml = None
+        self._wb = None
+        self._owns_wb = True
+        if isinstance(source, openpyxl.Workbook):
+            self._wb = source
+            self._owns_wb = False
+        elif (backend or XLSX_BACKEND) == "xml":
+            try:
+                self._xml = XlsxXmlReader(source)
+            except Exception as e:
+                print(f"⚠️ Fast XLSX reader unavailable ({type(e).__name__}: {e}); using openpyxl")
+        if self._xml is None and self._wb is None:
+            self._wb = self._load_openpyxl()
+        self.sheetnames = list((self._xml or self._wb).sheetnames)
+        self._rows = {}
+        self._columns = {}     # sheet -> columns materialized in _rows (None = all)
+        self._segments = {}
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self.sheetnames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for reader in (self._xml, self._wb if self._owns_wb else None):
+            try:
+                if reader is not None:
+                    reader.close()
+            except Exception:
+                pass
+
+    def _load_openpyxl(self):
+        if hasattr(self._source, "seek"):
+            self._source.seek(0)
+        return openpyxl.load_workbook(self._source, read_only=True, data_only=True)
+
+    def rows(self, sheet_name, max_col=None):
+        """
+        Rows of a sheet as value tuples; rows(...)[0] is Excel row 1. Rows hold
+        the sheet's declared columns, or at least max_col columns when given.
+        """
+        if sheet_name not in self._rows:
+            self._load(sheet_name, self.SHEET_COLUMNS.get(sheet_name))
+        loaded = self._columns[sheet_name]
+        if max_col is not None and loaded is not None and max_col > loaded:
+            self._load(sheet_name, max_col)
+        return self._rows[sheet_name]
+
+    def _load(self, sheet_name, max_col):
+        rows = None
+        if self._xml is not None:
+            try:
+                rows = [tuple(r) for r in self._xml.iter_rows(sheet_name, max_col=max_col)]
+            except Exception as e:
+                print(f"⚠️ Fast XLSX reader failed on {sheet_name} ({type(e).__name__}: {e}); using openpyxl")
+        if rows is None:
+            if self._wb is None:
+                self._wb = self._load_openpyxl()
+            ws = self._wb[sheet_name]
+            if hasattr(ws, "reset_dimensions"):
+                # Read-only sheets are bounded by the stored <dimension>, which is often stale
+                ws.reset_dimensions()
+            rows = [tuple(r) for r in ws.iter_rows(values_only=True)]
+            width = max_col or max(map(len, rows), default=0)
+            rows = [r[:width] + (None,) * (width - len(r)) for r in rows]
+        # trailing rows without a value (e.g. formatted but empty cells) end the sheet on both paths
+        while rows and all(v is None for v in rows[-1]):
+            rows.pop()
+        self._rows[sheet_name] = rows
+        self._columns[sheet_name] = max_col
+
+    def segment_sheet(self, sheet_name):
+        """SegmentSheet model of a By_* sheet, parsed once per context."""
+        if sheet_name not in self._segments:
+            self._segments[sheet_name] = SegmentSheet(sheet_name, self.rows(sheet_name))
+        return self._segments[sheet_name]
+
+    def max_row(self, sheet_name):
+        return len(self.rows(sheet_name))
+
+    def value(self, sheet_name, row, col):
+        """Value of a single cell (1-based row/col), None when out of range."""
+        rows = self.rows(sheet_name, max_col=col)
+        if row < 1 or row > len(rows):
+            return None
+        values = rows[row - 1]
+        return values[col - 1] if 1 <= col <= len(values) else None
+
+    def iter_rows(self, sheet_name, min_row=1, max_row=None, min_col=1, max_col=None):
+        """Same contract as openpyxl's iter_rows(values_only=True)."""
+        rows = self.rows(sheet_name, max_col=max_col)
+        stop = len(rows) if max_row is None else min(max_row, len(rows))
+        for values in rows[min_row - 1:stop]:
+            if max_col is None:
+                yield values[min_col - 1:]
+            else:
+                row = values[min_col - 1:max_col]
+                yield row + (None,) * (max_col - min_col + 1 - len(row))
+
+class SegmentSheet:
+    """
+    One-pass model of a By_* segmentation sheet.
+
+    The header area is scanned once to map every year to its column in the
+    sales volume block and to its header row in the share (%) block. Each block
+    is then read once into a TimeSeries (items x years), so per-year lookups,
+    CAGRs and rankings are array operations instead of rescans of the worksheet.
+    """
+
+    HEADER_SCAN_ROWS = 19   # header rows searched (rows 1..19)
+    BLOCK_ROWS = 9          # data rows read below a header
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self._volume_headers = {}   # year -> (header_row_idx, col_idx)
+        self._share_headers = {}    # year -> header_row_idx
+        self._volume_blocks = {}    # header_row_idx -> {item: row}
+        self._share_blocks = {}     # header_row_idx -> [row, ...]
+        self._volume_series = {}    # header_row_idx -> TimeSeries of volumes
+        self._share_series = {}     # header_row_idx -> TimeSeries of shares (%)
+        self._cagrs = {}            # (start, end) -> {item: "x.x%"}
+
+        for row_idx, row in enumerate(rows[:self.HEADER_SCAN_ROWS], start=1):
+            row_text = " ".join(str(cell) if cell else "" for cell in row)
+            is_share = "(%" in row_text
+            is_volume = not (is_share or " %" in row_text)
+            for col_idx, cell in enumerate(row):
+                if not cell:
+                    continue
+                for year in _years_in(str(cell)):
+                    if is_volume:
+                        self._volume_headers.setdefault(year, (row_idx, col_idx))
+                    elif is_share:
+                        self._share_headers.setdefault(year, row_idx)
+
+    def _block_rows(self, header_row_idx):
+        """Rows below a header until an empty/"Total" row (at most BLOCK_ROWS)."""
+        block = []
+        for row in self.rows[header_row_idx:header_row_idx + self.BLOCK_ROWS]:
+            if not row[0] or "Total" in str(row[0]):
+                break
+            block.append(row)
+        return block
+
+    def volume_header(self, year):
+        """(header_row_idx, col_idx) of year in the sales volume block, or None."""
+        return self._volume_headers.get(int(year))
+
+    def volume_block(self, header_row_idx):
+        """{item: row} for the sales volume block starting below header_row_idx."""
+        if header_row_idx not in self._volume_blocks:
+            block = {}
+            for row in self._block_rows(header_row_idx):
+                # Stop if we hit another section (like percentage section)
+                row_text = " ".join(str(cell) if cell else "" for cell in row)
+                if "(%" in row_text or "Volume Share" in row_text or "Market Breakup" in row_text:
+                    break
+                block[str(row[0]).strip()] = row
+            self._volume_blocks[header_row_idx] = block
+        return self._volume_blocks[header_row_idx]
+
+    def volume_series(self, header_row_idx):
+        """TimeSeries of the volume block below header_row_idx, over the years headed in that row."""
+        if header_row_idx not in self._volume_series:
+            columns = sorted((year, col_idx) for year, (row_idx, col_idx) in self._volume_headers.items()
+                             if row_idx == header_row_idx)
+            block = self.volume_block(header_row_idx)
+            values = [[_cell_number(row, col_idx) for _, col_idx in columns] for row in block.values()]
+            self._volume_series[header_row_idx] = TimeSeries([year for year, _ in columns], values, list(block))
+        return self._volume_series[header_row_idx]
+
+    def volumes_for_year(self, year):
+        """{item: volume} for year, or None if the year has no volume column."""
+        header = self.volume_header(year)
+        if header is None:
+            return None
+        return self.volume_series(header[0]).column(int(year))
+
+    def share_rows(self, year):
+        """Raw data rows of the share (%) block whose header mentions year."""
+        header_row_idx = self._share_headers.get(int(year))
+        if header_row_idx is None:
+            return None
+        if header_row_idx not in self._share_blocks:
+            self._share_blocks[header_row_idx] = self._block_rows(header_row_idx)
+        return self._share_blocks[header_row_idx]
+
+    def share_series(self, header_row_idx):
+        """TimeSeries of percentages in the share block below header_row_idx (rows in sheet order)."""
+        if header_row_idx not in self._share_series:
+            header = self.rows[header_row_idx - 1]
+            columns = []
+            for year, row_idx in sorted(self._share_headers.items()):
+                if row_idx != header_row_idx:
+                    continue
+                col_idx = next((i for i, cell in enumerate(header)
+                                if cell and str(year) in str(cell) and "(%" in str(cell)), None)
+                if col_idx is not None:
+                    columns.append((year, col_idx))
+            rows = self.share_rows(columns[0][0]) if columns else []
+            values = [[_cell_percent(row, col_idx) for _, col_idx in columns] for row in rows]
+            self._share_series[header_row_idx] = TimeSeries([year for year, _ in columns], values,
+                                                            [str(row[0]).strip() for row in rows])
+        return self._share_series[header_row_idx]
+
+    def _shares(self, year):
+        header_row_idx = self._share_headers.get(int(year))
+        if header_row_idx is None:
+            return None
+        series = self.share_series(header_row_idx)
+        return series if series._columns([int(year)])[0] >= 0 else None
+
+    def shares_for_year(self, year):
+        """[(item, pct), ...] in sheet order for year, or None without a "(%" column."""
+        series = self._shares(year)
+        return series.pairs(int(year)) if series is not None else None
+
+    def ranked_shares(self, year, top_n=None):
+        """shares_for_year, largest share first (ties keep sheet order)."""
+        series = self._shares(year)
+        return series.ranked(int(year), top_n) if series is not None else None
+
+    def cagrs(self, start_year=2025, end_year=2033):
+        """
+        {item: formatted CAGR} for every item of the sheet, computed in one pass.
+        A "CAGR <start>-<end>" column in the header rows wins; otherwise the
+        rate is derived from the two year columns of the volume block.
+        """
+        key = (int(start_year), int(end_year))
+        if key in self._cagrs:
+            return self._cagrs[key]
+
+        result = {}
+        # Existing CAGR column(s), first truthy value per item
+        span = f"{start_year}-{end_year}"
+        cagr_cols = [col_idx for row in self.rows[:5] for col_idx, cell in enumerate(row)
+                     if cell and "CAGR" in str(cell) and span in str(cell)]
+        for col_idx in cagr_cols:
+            for data_row in self.rows[5:]:
+                if not data_row[0]:
+                    continue
+                item_name = str(data_row[0]).strip()
+                cagr_val = data_row[col_idx] if col_idx < len(data_row) else None
+                if item_name not in result and cagr_val:
+                    result[item_name] = _format_cagr_cell(cagr_val)
+
+        # Everything else: vectorized over the start/end year columns
+        start_header, end_header = self.volume_header(start_year), self.volume_header(end_year)
+        if start_header and end_header and start_header[0] == end_header[0]:
+            series = self.volume_series(start_header[0])
+            names, rates = series.names, series.cagr(key[0], key[1])
+        else:
+            # the two years sit in different blocks
+            start_data = self.volumes_for_year(start_year) or {}
+            end_data = self.volumes_for_year(end_year) or {}
+            names = [n for n in start_data if n in end_data]
+            rates = compute_cagr([start_data[n] for n in names], [end_data[n] for n in names], key[1] - key[0])
+        for name, rate in zip(names, rates):
+            if name in result:
+                continue
+            formatted = format_cagr(rate)
+            if formatted:
+                result[name] = formatted
+
+        self._cagrs[key] = result
+        return result
+
+def _cell_number(row, col_idx):
+    """Cell as float (blank = 0), NaN when missing or not a number."""
+    try:
+        return float(row[col_idx]) if row[col_idx] is not None else 0
+    except (ValueError, TypeError, IndexError):
+        return np.nan
+
+def _cell_percent(row, col_idx):
+    """Share cell as a percentage (see as_percent), NaN when missing or not a number."""
+    value = _cell_number(row, col_idx)
+    return value if np.isnan(value) else as_percent(value)
+
+def _years_in(text):
+    """Every 4-digit run inside text (overlapping), as ints."""
+    return {int(text[i:i + 4]) for i in range(len(text) - 3) if text[i:i + 4].isdigit()}
+
+def as_percent(value):
+    """Scale a 0..1 share to percent; round everything to one decimal."""
+    if 0 < value < 1:
+        return round(value * 100, 1)
+    elif value:
+        return round(value, 1)
+    return value
+
+# --------------- CAGR engine ---------------
+
+def compute_cagr(start_values, end_values, periods):
+    """
+    Vectorized CAGR, ((end / start) ** (1 / periods) - 1), as fractions.
+    Pairs where either side is missing or not positive come back as NaN.
+    """
+    start = np.asarray(start_values, dtype=float)
+    end = np.asarray(end_values, dtype=float)
+    rates = np.full(start.shape, np.nan)
+    if periods <= 0:
+        return rates
+    with np.errstate(invalid="ignore"):
+        valid = (start > 0) & (end > 0)
+    rates[valid] = (end[valid] / start[valid]) ** (1.0 / periods) - 1
+    return rates
+
+def series_cagr(values_by_year, start_year, end_year):
+    """CAGR fraction between two years of a {year: value} series, or None."""
+    rate = compute_cagr([values_by_year.get(start_year)], [values_by_year.get(end_year)],
+                        end_year - start_year)[0]
+    return None if np.isnan(rate) else float(rate)
+
+def format_cagr(rate):
+    """Format a CAGR fraction as "x.x%" ("" when unavailable)."""
+    if rate is None or np.isnan(rate):
+        return ""
+    return f"{rate * 100:.1f}%"
+
+def _format_cagr_cell(val):
+    """Format a CAGR read from the sheet (fraction or already a percentage)."""
+    try:
+        return f"{float(val)*100:.1f}%" if abs(float(val)) < 1 else f"{float(val):.1f}%"
+    except:
+        return str(val)
+
+@contextmanager
+def use_workbook(source):
+    """
+    Yield a WorkbookContext for source. An existing context is passed through
+    untouched; a path/file is parsed once and closed when the block ends.
+    """
+    if isinstance(source, WorkbookContext):
+        yield source
+        return
+    ctx = WorkbookContext(source)
+    try:
+        yield ctx
+    finally:
+        ctx.close()
+
+# --------------- time series ---------------
+
+class TimeSeries:
+    """
+    Columnar yearly values: one sorted int year axis and a float matrix with a
+    row per series (the Sales_Forecast volume, or every item of a By_* block).
+    Missing or unreadable values are NaN.
+
+    A single-series store also reads like the {year: value} dict it replaced
+    (get, [], in, items), so update_charts_in_slide and other callers of the
+    volumes mapping keep working.
+    """
+
+    def __init__(self, years, values, names=("Volume",)):
+        self.years = np.asarray(years, dtype=np.int64)
+        self.names = list(names)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.names), len(self.years))
+        self._row_of = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_pairs(cls, pairs, name="Volume"):
+        """One series from (year, value) pairs; a repeated year keeps its last value."""
+        data = dict(pairs)
+        years = sorted(data)
+        return cls(years, [[np.nan if data[y] is None else data[y] for y in years]], [name])
+
+    def _columns(self, years):
+        """Column index of each year on the axis, -1 where the year is absent."""
+        years = np.atleast_1d(np.asarray(years, dtype=np.int64))
+        if not len(self.years):
+            return np.full(years.shape, -1)
+        pos = np.minimum(np.searchsorted(self.years, years), len(self.years) - 1)
+        return np.where(self.years[pos] == years, pos, -1)
+
+    def at(self, years, series=0, fill=np.nan):
+        """Values of one series (name or row number) for years; fill where absent or NaN."""
+        row = self.values[self._row_of[series] if isinstance(series, str) else series]
+        cols = self._columns(years)
+        out = np.full(cols.shape, fill, dtype=float)
+        found = cols >= 0
+        out[found] = row[cols[found]]
+        out[np.isnan(out)] = fill
+        return out
+
+    def pairs(self, year):
+        """[(name, value), ...] of every series with a value for year, in series order; None off the axis."""
+        col = self._columns([year])[0]
+        if col < 0:
+            return None
+        return [(name, float(value)) for name, value in zip(self.names, self.values[:, col]) if not np.isnan(value)]
+
+    def column(self, year):
+        """pairs() as a {name: value} dict."""
+        pairs = self.pairs(year)
+        return None if pairs is None else dict(pairs)
+
+    def cagr(self, start_year, end_year):
+        """CAGR fraction per series between two years (NaN where not computable)."""
+        return compute_cagr(self.at_all(start_year), self.at_all(end_year), end_year - start_year)
+
+    def at_all(self, year):
+        """Every series' value for year (NaN where absent)."""
+        col = self._columns([year])[0]
+        return self.values[:, col] if col >= 0 else np.full(len(self.names), np.nan)
+
+    def ranked(self, year, top_n=None):
+        """[(name, value), ...] for year, highest first; ties keep series order."""
+        values = self.at_all(year)
+        keep = np.flatnonzero(~np.isnan(values))
+        order = keep[np.argsort(-values[keep], kind="stable")]
+        ranked = [(self.names[i], float(values[i])) for i in order]
+        return ranked[:top_n] if top_n else ranked
+
+    # {year: value} view of the first series
+    def get(self, year, default=None):
+        try:
+            value = self.at([int(year)], fill=np.nan)[0]
+        except (TypeError, ValueError):
+            return default
+        return default if np.isnan(value) else float(value)
+
+    def __getitem__(self, year):
+        value = self.get(year)
+        if value is None:
+            raise KeyError(year)
+        return value
+
+    def __contains__(self, year):
+        return self.get(year) is not None
+
+    def items(self):
+        row = self.values[0] if len(self.names) else []
+        return [(int(y), float(v)) for y, v in zip(self.years, row) if not np.isnan(v)]
+
+    def __len__(self):
+        return len(self.items())
+
+    def __iter__(self):
+        return (year for year, _ in self.items())
+
+# --------------- AI generation ---------------
+
+GENAI_MODEL_NAME = "gemini-1.5-flash"
+# Deterministic mode: temperature 0 and cached narratives never expire, so re-runs are instant and identical
+AI_DETERMINISTIC = os.environ.get("AI_DETERMINISTIC", "").lower() in ("1", "true", "yes")
+AI_CALL_TIMEOUT = float(os.environ.get("AI_CALL_TIMEOUT", "60"))      # seconds per Gemini call
+AI_BUDGET_SECONDS = float(os.environ.get("AI_BUDGET_SECONDS", "90"))  # seconds for a concurrent batch
+
+class RateLimiter:
+    """
+    Thread-safe request spacing for one backend: at most rate_per_sec calls
+    start per second across all threads (rate_per_sec <= 0 disables it).
+    """
+
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+RATE_LIMITS = {
+    "gemini": RateLimiter(float(os.environ.get("GEMINI_MAX_RPS", "5"))),
+    "wikipedia": RateLimiter(float(os.environ.get("WIKIPEDIA_MAX_RPS", "10"))),
+}
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGenerativeModel:
+    """
+    Offline stand-in for genai.GenerativeModel (set GENAI_FAKE=1).
+    Answers with canned text after GENAI_FAKE_DELAY seconds, so the pipeline
+    and its timeouts can be exercised without a key or network.
+    """
+
+    def __init__(self, model_name=GENAI_MODEL_NAME, *args, **kwargs):
+        self.model_name = model_name
+        self.delay = float(os.environ.get("GENAI_FAKE_DELAY", "0"))
+
+    def generate_content(self, prompt, *args, **kwargs):
+        if self.delay:
+            time.sleep(self.delay)
+        m = re.search(r"COMPANIES_JSON:\s*(\[.*?\])\s*$", prompt, re.M)
+        if m:
+            return _FakeResponse(json.dumps([dict(_blank_company_details(), name=name)
+                                             for name in json.loads(m.group(1))]))
+        m = re.search(r'the company "(.+?)"', prompt)
+        if m:
+            return _FakeResponse(json.dumps({"founding_year": "", "headquarters": "", "website": "",
+                                             "products_offered": []}))
+        m = re.search(r"for the (.*?) market", prompt)
+        return _FakeResponse(f"Offline placeholder text for the {m.group(1) if m else ''} market.")
+
+def _generative_model(model_name=GENAI_MODEL_NAME):
+    if os.environ.get("GENAI_FAKE"):
+        return FakeGenerativeModel(model_name)
+    return genai.GenerativeModel(model_name)
+
+def ai_generate_text(prompt, timeout=None, deterministic=None):
+    """One Gemini round trip; returns the stripped response text."""
+    timeout = AI_CALL_TIMEOUT if timeout is None else timeout
+    deterministic = AI_DETERMINISTIC if deterministic is None else deterministic
+    model = _generative_model()
+    kwargs = {"request_options": {"timeout": timeout}}
+    if deterministic:
+        kwargs["generation_config"] = {"temperature": 0, "candidate_count": 1}
+    RATE_LIMITS["gemini"].acquire()
+    response = model.generate_content(prompt, **kwargs)
+    return getattr(response, "text", "").strip()
+
+def cached_ai_text(prompt, clean=None, use_cache=True):
+    """
+    Cleaned model output for prompt, reused from AI_TEXT_CACHE when the same
+    prompt (by fingerprint) was answered before. Empty answers are not cached.
+    """
+    fingerprint = prompt_fingerprint(prompt)
+    if use_cache:
+        cached = AI_TEXT_CACHE.get(fingerprint, ignore_ttl=AI_DETERMINISTIC)
+        if cached:
+            return cached
+    text = ai_generate_text(prompt)
+    if clean is not None:
+        text = clean(text)
+    if use_cache and text:
+        AI_TEXT_CACHE.set(fingerprint, text)
+    return text
+
+def prompt_fingerprint(prompt):
+    """Stable identity of a prompt (whitespace-insensitive), plus the model it is sent to."""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{GENAI_MODEL_NAME}\n{normalized}".encode("utf-8")).hexdigest()
+
+def run_ai_generations(jobs, timeout=None, budget=None):
+    """
+    Run independent text generations concurrently.
+    jobs maps a result key to a zero-argument callable returning text.
+    Each call gets the per-call timeout; once the overall budget is spent,
+    calls that have not started are cancelled and unfinished keys come back "".
+    """
+    if not jobs:
+        return {}
+    timeout = AI_CALL_TIMEOUT if timeout is None else timeout
+    budget = AI_BUDGET_SECONDS if budget is None else budget
+    results = {key: "" for key in jobs}
+
+    executor = ThreadPoolExecutor(max_workers=len(jobs))
+    futures = {executor.submit(fn): key for key, fn in jobs.items()}
+    try:
+        done, pending = wait(futures, timeout=min(timeout, budget))
+        for future in done:
+            try:
+                results[futures[future]] = future.result() or ""
+            except Exception as e:
+                print(f"AI generation for {futures[future]} failed: {e}")
+        for future in pending:
+            future.cancel()
+            print(f"⚠️ AI generation for {futures[future]} timed out")
+    finally:
+        # don't block the request on calls that overran; their results are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+# --------------- persistent cache ---------------
+
+CACHE_DB_PATH = os.environ.get("PPT_CRAFTER_CACHE_DB", os.path.join(tempfile.gettempdir(), "ppt_crafter_cache.sqlite3"))
+COMPANY_CACHE_TTL = float(os.environ.get("COMPANY_CACHE_TTL_DAYS", "30")) * 86400
+
+class PersistentCache:
+    """
+    Small SQLite key/value store shared by every process on the host.
+    Values are JSON; entries older than ttl seconds read as missing, and with
+    max_entries set the oldest entries are evicted on write.
+    An empty path disables the cache (get misses, set is a no-op).
+    """
+
+    def __init__(self, path, namespace, ttl=None, max_entries=None):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, "
+                             "stored_at REAL, PRIMARY KEY (namespace, key))")
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def get(self, key, ignore_ttl=False):
+        if not self.path:
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?",
+                                   (self.namespace, key)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache read failed ({self.namespace}): {e}")
+            return None
+        if row is None or (not ignore_ttl and self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                             (self.namespace, key, json.dumps(value), time.time()))
+                if self.max_entries:
+                    conn.execute("DELETE FROM cache WHERE namespace = ? AND key NOT IN "
+                                 "(SELECT key FROM cache WHERE namespace = ? ORDER BY stored_at DESC LIMIT ?)",
+                                 (self.namespace, self.namespace, self.max_entries))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache write failed ({self.namespace}): {e}")
+
+    def invalidate(self, key=None):
+        """Drop one entry, or the whole namespace when key is None."""
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            try:
+                if key is None:
+                    conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+                else:
+                    conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache invalidation failed ({self.namespace}): {e}")
+
+COMPANY_CACHE = PersistentCache(CACHE_DB_PATH, "company_details", ttl=COMPANY_CACHE_TTL)
+
+AI_TEXT_CACHE = PersistentCache(CACHE_DB_PATH, "ai_text",
+                                ttl=float(os.environ.get("AI_CACHE_TTL_DAYS", "14")) * 86400,
+                                max_entries=int(os.environ.get("AI_CACHE_MAX_ENTRIES", "2000")))
+
+def normalize_company_name(name):
+    """Cache key for a company: case-folded, punctuation dropped, whitespace collapsed."""
+    return " ".join(re.sub(r"[^\w]+", " ", str(name).casefold()).split())
+
+def invalidate_company_details(company_name=None):
+    """Forget cached details for one company, or for all companies."""
+    COMPANY_CACHE.invalidate(None if company_name is None else normalize_company_name(company_name))
+
 # --------------- helpers ---------------
 
 def read_summary_keys(excel_path, sheet_name="Summary"):
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    ws = wb[sheet_name]
+    with use_workbook(excel_path) as wb:
+        rows = list(wb.iter_rows(sheet_name, min_row=2, min_col=1, max_col=2))
     kv = {}
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row,
-                            min_col=1, max_col=2, values_only=True):
+    for row in rows:
         key, val = row
         if key is None:
             continue
@@ -80,22 +979,18 @@ def find_year_col(header, year):
             return idx
     raise ValueError(f"Year {year} not found in headers: {header}")
 
-def generate_overview_ai_content(excel_path, existing_kv=None, use_ai=True):
-    """
-    Generate detailed overview content using AI based on Excel data and market information
-    """
-    if not use_ai:
-        return ""
-    
+def build_overview_ai_prompt(excel_path, existing_kv=None):
+    """Prompt for the report overview section (see generate_overview_ai_content)."""
     # Use provided kv data if available, otherwise extract fresh
     if existing_kv:
         kv = existing_kv
     else:
-        kv = read_summary_keys(excel_path, "Summary")
-        # Extract basic dynamic data for AI prompt
-        wb = openpyxl.load_workbook(excel_path, data_only=True)
-        
-        title = wb["Summary"]["B2"].value if "Summary" in wb.sheetnames else ""
+        with use_workbook(excel_path) as wb:
+            kv = read_summary_keys(wb, "Summary")
+            # Extract basic dynamic data for AI prompt
+            title = wb.value("Summary", 2, 2) if "Summary" in wb else ""
+            units = wb.value("Summary", 4, 2) if "Summary" in wb else ""
+
         if title:
             parts = title.split()
             country = parts[0] if len(parts) > 0 else ""
@@ -104,7 +999,6 @@ def generate_overview_ai_content(excel_path, existing_kv=None, use_ai=True):
             country = ""
             product = ""
         
-        units = wb["Summary"]["B4"].value if "Summary" in wb.sheetnames else ""
         unit = "Thousand Tons" if units and "Thousand Tons" in units else units or ""
         
         kv.update({
@@ -114,15 +1008,11 @@ def generate_overview_ai_content(excel_path, existing_kv=None, use_ai=True):
             "Unit": unit,
         })
     
-    # Extract current market size and key data points
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    
     # Get basic market data for context
     market_size = kv.get('Sales_Volume_Latest', '')
     latest_year = kv.get('Latest_Year', '2024')
     
-    try:
-        prompt = f"""
+    return f"""
         Write a detailed and exhaustive overview for the {kv.get('Title', '')} market. Use paragraph form and write exactly 350 words.
         
         Market Context:
@@ -145,91 +1035,90 @@ def generate_overview_ai_content(excel_path, existing_kv=None, use_ai=True):
         
         Write a comprehensive, technical, and market-focused overview that would be suitable for an industry report introduction section.
         """
-        
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        
-        content = getattr(response, "text", "").strip()
-        
-        # Clean up any unwanted formatting
-        content = re.sub(r'\*\*([^*]+)\*\*', r'\1', content)  # Remove bold markdown
-        content = re.sub(r'\*([^*]+)\*', r'\1', content)      # Remove italic markdown
-        content = re.sub(r'#+\s*', '', content)              # Remove headers
-        content = re.sub(r'^\s*[-•]\s*', '', content, flags=re.MULTILINE)  # Remove bullet points
-        
-        return content
-        
+
+def clean_overview_ai_content(content):
+    # Clean up any unwanted formatting
+    content = clean_market_overview_content(content)
+    content = re.sub(r'^\s*[-•]\s*', '', content, flags=re.MULTILINE)  # Remove bullet points
+    return content
+
+def generate_overview_ai_content(excel_path, existing_kv=None, use_ai=True):
+    """
+    Generate detailed overview content using AI based on Excel data and market information
+    """
+    if not use_ai:
+        return ""
+    
+    try:
+        prompt = build_overview_ai_prompt(excel_path, existing_kv)
+        return cached_ai_text(prompt, clean_overview_ai_content)
     except Exception as e:
         print(f"AI overview content generation failed: {e}")
         return ""
 
-def generate_market_overview_content(excel_path, existing_kv=None, use_ai=True):
+def build_market_overview_prompt(excel_path, existing_kv=None):
     """
-    Generate detailed market overview content using AI based on Excel data
+    Prompt for the market overview section (see generate_market_overview_content)
     Takes existing_kv to avoid circular dependency
     """
-    if not use_ai:
-        return ""
-    
     # Use provided kv data if available, otherwise extract fresh (but don't include Market_Overview_Content)
-    if existing_kv:
-        kv = existing_kv
-    else:
-        kv = read_summary_keys(excel_path, "Summary")
-        # Extract basic dynamic data WITHOUT calling the full extract_dynamic_placeholders
-        wb = openpyxl.load_workbook(excel_path, data_only=True)
-        
-        # Extract only essential data needed for AI prompt
-        title = wb["Summary"]["B2"].value if "Summary" in wb.sheetnames else ""
-        if title:
-            parts = title.split()
-            country = parts[0] if len(parts) > 0 else ""
-            product = parts[1] if len(parts) > 1 else ""
+    with use_workbook(excel_path) as wb:
+        if existing_kv:
+            kv = existing_kv
         else:
-            country = ""
-            product = ""
-        
-        units = wb["Summary"]["B4"].value if "Summary" in wb.sheetnames else ""
-        unit = "Thousand Tons" if units and "Thousand Tons" in units else units or ""
-        
-        # Sales Forecast data
-        if "Sales_Forecast" in wb.sheetnames:
-            ws = wb["Sales_Forecast"]
-            years = [r[0] for r in ws.iter_rows(min_row=2, values_only=True) if r[0]]
-            volumes = {row[0]: row[1] for row in ws.iter_rows(min_row=2, values_only=True)}
-            latest_year = max(y for y in years if y <= 2024) if years else 2024
+            kv = read_summary_keys(wb, "Summary")
+            # Extract basic dynamic data WITHOUT calling the full extract_dynamic_placeholders
             
-            kv.update({
-                "Title": title,
-                "Country": country,
-                "Product": product,
-                "Unit": unit,
-                "Latest_Year": str(latest_year),
-                "Sales_Volume_Latest": f"{volumes.get(latest_year, 0):,.0f}",
-                "Sales_Volume_2033": f"{volumes.get(2033, 0):,.0f}",
-            })
+            # Extract only essential data needed for AI prompt
+            title = wb.value("Summary", 2, 2) if "Summary" in wb else ""
+            if title:
+                parts = title.split()
+                country = parts[0] if len(parts) > 0 else ""
+                product = parts[1] if len(parts) > 1 else ""
+            else:
+                country = ""
+                product = ""
             
-            # Get CAGR values
-            def fmt_pct(val):
-                try:
-                    return f"{float(val)*100:.1f}%" if abs(float(val)) < 1 else f"{float(val):.1f}%"
-                except:
-                    return str(val) if val else ""
+            units = wb.value("Summary", 4, 2) if "Summary" in wb else ""
+            unit = "Thousand Tons" if units and "Thousand Tons" in units else units or ""
             
-            kv["CAGR_2019_2024"] = fmt_pct(ws["C7"].value) if ws["C7"].value else ""
-            kv["CAGR_2025_2033"] = fmt_pct(ws["D16"].value) if ws["D16"].value else ""
-    
-    # Extract segmentation data for AI prompt
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    
-    # Get top segments from each sheet
-    type_data = get_sheet_percentage_data("By_Type", wb)
-    app_data = get_sheet_percentage_data("By_Application", wb)
-    enduser_data = get_sheet_percentage_data("By_EndUser", wb)
-    region_data = get_sheet_percentage_data("By_Region", wb)
+            # Sales Forecast data
+            if "Sales_Forecast" in wb:
+                sf_rows = list(wb.iter_rows("Sales_Forecast", min_row=2))
+                years = [r[0] for r in sf_rows if r[0]]
+                volumes = {row[0]: row[1] for row in sf_rows}
+                latest_year = max(y for y in years if y <= 2024) if years else 2024
+                
+                kv.update({
+                    "Title": title,
+                    "Country": country,
+                    "Product": product,
+                    "Unit": unit,
+                    "Latest_Year": str(latest_year),
+                    "Sales_Volume_Latest": f"{volumes.get(latest_year, 0):,.0f}",
+                    "Sales_Volume_2033": f"{volumes.get(2033, 0):,.0f}",
+                })
+                
+                # Get CAGR values
+                def fmt_pct(val):
+                    try:
+                        return f"{float(val)*100:.1f}%" if abs(float(val)) < 1 else f"{float(val):.1f}%"
+                    except:
+                        return str(val) if val else ""
+                
+                cagr_hist = wb.value("Sales_Forecast", 7, 3)
+                cagr_fcst = wb.value("Sales_Forecast", 16, 4)
+                kv["CAGR_2019_2024"] = fmt_pct(cagr_hist) if cagr_hist else ""
+                kv["CAGR_2025_2033"] = fmt_pct(cagr_fcst) if cagr_fcst else ""
+        
+        # Extract segmentation data for AI prompt
+        # Get top segments from each sheet
+        type_data = get_sheet_percentage_data("By_Type", wb)
+        app_data = get_sheet_percentage_data("By_Application", wb)
+        enduser_data = get_sheet_percentage_data("By_EndUser", wb)
+        region_data = get_sheet_percentage_data("By_Region", wb)
     
-    try:
-        prompt = f"""
+    return f"""
         Write a detailed and exhaustive market overview for the {kv.get('Title', '')} market in exactly 230 words. Use paragraph form.
         
         Key Market Data:
@@ -257,268 +1146,249 @@ def generate_market_overview_content(excel_path, existing_kv=None, use_ai=True):
         
         Focus on providing comprehensive market intelligence that would be valuable for business decision-making.
         """
-        
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        
-        content = getattr(response, "text", "").strip()
-        
-        # Clean up any unwanted formatting
-        content = re.sub(r'\*\*([^*]+)\*\*', r'\1', content)  # Remove bold markdown
-        content = re.sub(r'\*([^*]+)\*', r'\1', content)      # Remove italic markdown
-        content = re.sub(r'#+\s*', '', content)              # Remove headers
-        
-        return content
-        
+
+def clean_market_overview_content(content):
+    # Clean up any unwanted formatting
+    content = re.sub(r'\*\*([^*]+)\*\*', r'\1', content)  # Remove bold markdown
+    content = re.sub(r'\*([^*]+)\*', r'\1', content)      # Remove italic markdown
+    content = re.sub(r'#+\s*', '', content)              # Remove headers
+    return content
+
+def generate_market_overview_content(excel_path, existing_kv=None, use_ai=True):
+    """
+    Generate detailed market overview content using AI based on Excel data
+    Takes existing_kv to avoid circular dependency
+    """
+    if not use_ai:
+        return ""
+    
+    try:
+        prompt = build_market_overview_prompt(excel_path, existing_kv)
+        return cached_ai_text(prompt, clean_market_overview_content)
     except Exception as e:
         print(f"AI content generation failed: {e}")
         return ""
 
 def get_sheet_percentage_data(sheet_name, workbook):
     """Extract percentage data from segmentation sheets - simplified version"""
-    if sheet_name not in workbook.sheetnames:
-        return []
-    
-    ws = workbook[sheet_name]
+    with use_workbook(workbook) as wb:
+        if sheet_name not in wb:
+            return []
+        share_rows = wb.segment_sheet(sheet_name).share_rows(2024) or []
     data = []
     
-    # Look for percentage section
-    for row_idx in range(1, 20):
-        row = list(ws.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-        row_text = " ".join(str(cell) if cell else "" for cell in row)
-        
-        if "(%" in row_text and "2024" in row_text:
-            # Found percentage section, extract data
-            for data_row_idx in range(row_idx + 1, min(row_idx + 10, ws.max_row + 1)):
-                data_row = list(ws.iter_rows(min_row=data_row_idx, max_row=data_row_idx, values_only=True))[0]
-                
-                if not data_row[0] or "Total" in str(data_row[0]):
+    for data_row in share_rows:
+        item_name = str(data_row[0]).strip()
+        try:
+            # Find the percentage column (usually column 1 or 2)
+            value = None
+            for col_idx in range(1, min(3, len(data_row))):
+                if data_row[col_idx] is not None:
+                    value = as_percent(float(data_row[col_idx]))
                     break
-                
-                item_name = str(data_row[0]).strip()
-                try:
-                    # Find the percentage column (usually column 1 or 2)
-                    value = None
-                    for col_idx in range(1, min(3, len(data_row))):
-                        if data_row[col_idx] is not None:
-                            value = float(data_row[col_idx])
-                            if 0 < value < 1:
-                                value = round(value * 100, 1)
-                            elif value:
-                                value = round(value, 1)
-                            break
-                    
-                    if value is not None:
-                        data.append((item_name, value))
-                except (ValueError, TypeError, IndexError):
-                    continue
-            break
+            
+            if value is not None:
+                data.append((item_name, value))
+        except (ValueError, TypeError, IndexError):
+            continue
     
     return sorted(data, key=lambda x: x[1] if x[1] is not None else 0, reverse=True)
 
-def extract_dynamic_placeholders(excel_path, include_market_overview=True, include_overview_content=True):
-    """Extract dynamic placeholders from Sales_Forecast + segmentation sheets."""
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    kv = {}
+AI_SECTION_KEYS = ("Market_Overview_Content", "Overview_AI_Content")
 
-    # --- Title ---
-    title = wb["Summary"]["B2"].value
-    kv["Title"] = title
-    if title:
-        parts = title.split()
-        kv["Country"] = parts[0] if len(parts) > 0 else ""
-        kv["Product"] = parts[1] if len(parts) > 1 else ""
-
-    # --- Units ---
-    units = wb["Summary"]["B4"].value if "Summary" in wb.sheetnames else ""
-    kv["Unit"] = "Thousand Tons" if units and "Thousand Tons" in units else units
-
-    # --- Sales Forecast ---
-    ws = wb["Sales_Forecast"]
-    years = [r[0] for r in ws.iter_rows(min_row=2, values_only=True) if r[0]]
-    volumes = {int(row[0]): float(row[1]) if row[1] is not None else 0.0 for row in ws.iter_rows(min_row=2, values_only=True) if row[0] is not None}
-    latest_year = max(y for y in years if y <= 2024)
-    kv["Latest_Year"] = str(latest_year)
-    kv["Sales_Volume_Latest"] = f"{volumes.get(int(latest_year), 0):,.0f}"
-    kv["Sales_Volume_2033"] = f"{volumes.get(2033, 0):,.0f}"
-    kv["Historical_Start_Year"] = "2019"
-    kv["Historical_End_Year"] = str(latest_year)
-    kv["Forecast_Start_Year"] = "2025"
-    kv["Forecast_End_Year"] = "2033"
-
-    # Format CAGRs nicely
-    def fmt_pct(val):
-        try:
-            return f"{float(val)*100:.1f}%" if abs(float(val)) < 1 else f"{float(val):.1f}%"
-        except:
-            return str(val) if val else ""
-
-    kv["CAGR_2019_2024"] = fmt_pct(ws["C7"].value)
-    kv["CAGR_2025_2033"] = fmt_pct(ws["D16"].value)
+def build_ai_prompts(wb, kv, keys):
+    """{key: (prompt, clean)} for the AI sections in keys, from the kv of extract_dynamic_placeholders."""
+    builders = {
+        "Market_Overview_Content": (build_market_overview_prompt, clean_market_overview_content),
+        "Overview_AI_Content": (build_overview_ai_prompt, clean_overview_ai_content),
+    }
+    return {key: (build(wb, existing_kv=kv), clean) for key, (build, clean) in builders.items() if key in keys}
 
-    try:
-        cagr_val = float(str(ws["C7"].value))
-        kv["Trend_Phrase"] = "growing" if cagr_val > 0 else "declining" if cagr_val < 0 else "remaining stable"
-    except:
-        kv["Trend_Phrase"] = ""
+def generate_ai_sections(prompts, metrics=None):
+    """
+    {key: text} for build_ai_prompts() output, the Gemini calls running
+    concurrently. Prompts answered before come from AI_TEXT_CACHE. Timed as the
+    "ai" stage of metrics, if given.
+    """
+    if not prompts:
+        return {}
+    ai_jobs = {key: (lambda prompt=prompt, clean=clean: cached_ai_text(prompt, clean))
+               for key, (prompt, clean) in prompts.items()}
+    with pipeline_stage(metrics, "ai") as m:
+        texts = run_ai_generations(ai_jobs)
+        if m:
+            m.count("ai_sections", len(ai_jobs))
+            # failed or timed-out sections come back empty
+            m.count("ai_empty", sum(1 for key in ai_jobs if not texts.get(key)))
+    return texts
 
-    # --- Updated processor for volume data only ---
-    def process_sheet_volume_data(sheet_name, top_n=None):
-        """Process sheet to get VOLUME data (not percentage data)"""
-        ws = wb[sheet_name]
-        
-        # Use the updated function to get volume data for latest year
-        volume_data = get_sheet_data_for_year(excel_path, sheet_name, latest_year)
-        
-        # Convert to list of tuples and sort
-        data = [(name, value) for name, value in volume_data.items()]
-        data.sort(key=lambda x: x[1] if x[1] is not None else 0, reverse=True)
-        
-        return data if not top_n else data[:top_n], data
+def extract_dynamic_placeholders(excel_path, include_market_overview=True, include_overview_content=True, metrics=None):
+    """
+    Extract dynamic placeholders from Sales_Forecast + segmentation sheets,
+    plus the AI sections asked for (see generate_ai_sections).
+    """
+    with use_workbook(excel_path) as wb:
+        kv = {}
 
-    # --- Updated processor for percentage data ---
-    def process_sheet_percentage_data(sheet_name, top_n=None):
-        """Process sheet to get PERCENTAGE data specifically"""
-        ws = wb[sheet_name]
-        
-        # Look for percentage section
-        header_row_idx = None
-        year_col_idx = None
-        
-        for row_idx in range(1, 20):
-            row = list(ws.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-            row_text = " ".join(str(cell) if cell else "" for cell in row)
-            
-            # Look for percentage section AND the year
-            if "(%" in row_text and str(latest_year) in row_text:
-                for col_idx, cell in enumerate(row):
-                    if cell and str(latest_year) in str(cell) and "(%" in str(cell):
-                        header_row_idx = row_idx
-                        year_col_idx = col_idx
-                        break
-                break
-        
-        if header_row_idx is None or year_col_idx is None:
-            return [], []
-        
-        # Extract percentage data
-        data = []
-        for row_idx in range(header_row_idx + 1, min(header_row_idx + 10, ws.max_row + 1)):
-            row = list(ws.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-            
-            if not row[0] or "Total" in str(row[0]):
-                break
-                
-            item_name = str(row[0]).strip()
+        # --- Title ---
+        title = wb.value("Summary", 2, 2)
+        kv["Title"] = title
+        if title:
+            parts = title.split()
+            kv["Country"] = parts[0] if len(parts) > 0 else ""
+            kv["Product"] = parts[1] if len(parts) > 1 else ""
+
+        # --- Units ---
+        units = wb.value("Summary", 4, 2) if "Summary" in wb else ""
+        kv["Unit"] = "Thousand Tons" if units and "Thousand Tons" in units else units
+
+        # --- Sales Forecast ---
+        sf_rows = list(wb.iter_rows("Sales_Forecast", min_row=2))
+        years = [r[0] for r in sf_rows if r[0]]
+        volumes = TimeSeries.from_pairs((int(row[0]), float(row[1]) if row[1] is not None else 0.0)
+                                        for row in sf_rows if row[0] is not None)
+        latest_year = max(y for y in years if y <= 2024)
+        kv["Latest_Year"] = str(latest_year)
+        kv["Sales_Volume_Latest"] = f"{volumes.get(int(latest_year), 0):,.0f}"
+        kv["Sales_Volume_2033"] = f"{volumes.get(2033, 0):,.0f}"
+        kv["Historical_Start_Year"] = "2019"
+        kv["Historical_End_Year"] = str(latest_year)
+        kv["Forecast_Start_Year"] = "2025"
+        kv["Forecast_End_Year"] = "2033"
+
+        # Format CAGRs nicely
+        def fmt_pct(val):
             try:
-                value = float(row[year_col_idx]) if row[year_col_idx] is not None else 0
-                # Convert to percentage if it's a decimal
-                if 0 < value < 1:
-                    value = round(value * 100, 1)
-                elif value:
-                    value = round(value, 1)
-                data.append((item_name, value))
-            except (ValueError, TypeError, IndexError):
-                continue
-        
-        data.sort(key=lambda x: x[1] if x[1] is not None else 0, reverse=True)
-        return data if not top_n else data[:top_n], data
-
-    # By_Type (top 3 + aliases) - USE PERCENTAGE DATA
-    type_top, _ = process_sheet_percentage_data("By_Type", top_n=None)
-    for i, (name, val) in enumerate(type_top, start=1):
-        kv[f"Top_Type_{i}"] = name
-        kv[f"Top_Type_{i}_Share"] = f"{val:.1f}" if val is not None else ""
-    if len(type_top) >= 1:
-        kv["Top_Type"] = type_top[0][0]
-        kv["Top_Type_Share"] = f"{type_top[0][1]:.1f}"
-    if len(type_top) >= 2:
-        kv["Second_Type"] = type_top[1][0]
-        kv["Second_Type_Share"] = f"{type_top[1][1]:.1f}"
-    if len(type_top) >= 3:
-        kv["Third_Type"] = type_top[2][0]
-        kv["Third_Type_Share"] = f"{type_top[2][1]:.1f}"
-
-    # By_Application (top 5 + aliases + others) - USE PERCENTAGE DATA
-    app_top, app_all = process_sheet_percentage_data("By_Application")
-    for i, (name, val) in enumerate(app_top[:5], start=1):
-        kv[f"Top_Application_{i}"] = name
-        kv[f"Top_Application_{i}_Share"] = f"{val:.1f}" if val is not None else ""
-    aliases = ["Top", "Second", "Third", "Fourth", "Fifth"]
-    for i, alias in enumerate(aliases, start=1):
-        if len(app_top) >= i:
-            kv[f"{alias}_Application"] = app_top[i-1][0]
-            kv[f"{alias}_Application_Share"] = f"{app_top[i-1][1]:.1f}"
-    if len(app_all) > 5:
-        kv["Other_Application_Share"] = f"{sum(v for _, v in app_all[5:] if v):.1f}"
-
-    # By_EndUser (top 5 + aliases + others) - USE PERCENTAGE DATA
-    eu_top, eu_all = process_sheet_percentage_data("By_EndUser")
-    for i, (name, val) in enumerate(eu_top[:5], start=1):
-        kv[f"Top_EndUser_{i}"] = name
-        kv[f"Top_EndUser_{i}_Share"] = f"{val:.1f}" if val is not None else ""
-    aliases = ["Top", "Second", "Third", "Fourth", "Fifth"]
-    for i, alias in enumerate(aliases, start=1):
-        if len(eu_top) >= i:
-            kv[f"{alias}_EndUser"] = eu_top[i-1][0]
-            kv[f"{alias}_EndUser_Share"] = f"{eu_top[i-1][1]:.1f}"
-    if len(eu_all) > 5:
-        kv["Other_EndUser_Share"] = f"{sum(v for _, v in eu_all[5:] if v):.1f}"
-
-    # By_Region (all dynamically, from % block) - USE PERCENTAGE DATA
-    reg_all, _ = process_sheet_percentage_data("By_Region")
-    for i, (name, val) in enumerate(reg_all, start=1):
-        kv[f"Top_Region_{i}"] = name
-        kv[f"Top_Region_{i}_Share"] = f"{val:.1f}" if val is not None else ""
-
-    # --- Narrative lines ---
-    kv["Market_Intro_Line"] = (
-        f"The {kv['Product'].lower()} market in {kv['Country']} reached a volume of "
-        f"{kv['Sales_Volume_Latest']} {kv['Unit']} in {kv['Latest_Year']}, "
-        f"{kv['Trend_Phrase']} at a CAGR of {kv['CAGR_2019_2024']} during 2019–2024."
-    )
-
-    kv["Market_Outlook_Line"] = (
-        f"Overall, the {kv['Product'].lower()} market in {kv['Country']} is expected to grow "
-        f"at a CAGR of {kv['CAGR_2025_2033']} during 2025–2033, reaching sales worth "
-        f"{kv['Sales_Volume_2033']} {kv['Unit']} by 2033."
-    )
+                return f"{float(val)*100:.1f}%" if abs(float(val)) < 1 else f"{float(val):.1f}%"
+            except:
+                return str(val) if val else ""
+
+        # Stored CAGR cells win; if they are blank, derive them from the series
+        cagr_hist = wb.value("Sales_Forecast", 7, 3)
+        if cagr_hist is None:
+            cagr_hist = series_cagr(volumes, 2019, int(latest_year))
+        cagr_fcst = wb.value("Sales_Forecast", 16, 4)
+        if cagr_fcst is None:
+            cagr_fcst = series_cagr(volumes, 2025, 2033)
+        kv["CAGR_2019_2024"] = fmt_pct(cagr_hist)
+        kv["CAGR_2025_2033"] = fmt_pct(cagr_fcst)
 
-    if include_market_overview:
-        # Generate market overview content using the data we just extracted
-        kv["Market_Overview_Content"] = generate_market_overview_content(excel_path, existing_kv=kv, use_ai=True)
-    
-    # NEW: Generate overview AI content
-    if include_overview_content:
-        kv["Overview_AI_Content"] = generate_overview_ai_content(excel_path, existing_kv=kv, use_ai=True)
+        try:
+            cagr_val = float(str(cagr_hist))
+            kv["Trend_Phrase"] = "growing" if cagr_val > 0 else "declining" if cagr_val < 0 else "remaining stable"
+        except:
+            kv["Trend_Phrase"] = ""
+
+        # --- Updated processor for volume data only ---
+        def process_sheet_volume_data(sheet_name, top_n=None):
+            """Process sheet to get VOLUME data (not percentage data)"""
+            # Items ranked by volume for the latest year
+            segment = wb.segment_sheet(sheet_name) if sheet_name in wb else None
+            header = segment.volume_header(latest_year) if segment else None
+            if header is None:
+                return [], []
+            data = segment.volume_series(header[0]).ranked(latest_year)
+            return data if not top_n else data[:top_n], data
+
+        # --- Updated processor for percentage data ---
+        def process_sheet_percentage_data(sheet_name, top_n=None):
+            """Process sheet to get PERCENTAGE data specifically"""
+            # Percentage block for the latest year, largest share first
+            data = wb.segment_sheet(sheet_name).ranked_shares(latest_year)
+            if data is None:
+                return [], []
+            return data if not top_n else data[:top_n], data
+
+        # By_Type (top 3 + aliases) - USE PERCENTAGE DATA
+        type_top, _ = process_sheet_percentage_data("By_Type", top_n=None)
+        for i, (name, val) in enumerate(type_top, start=1):
+            kv[f"Top_Type_{i}"] = name
+            kv[f"Top_Type_{i}_Share"] = f"{val:.1f}" if val is not None else ""
+        if len(type_top) >= 1:
+            kv["Top_Type"] = type_top[0][0]
+            kv["Top_Type_Share"] = f"{type_top[0][1]:.1f}"
+        if len(type_top) >= 2:
+            kv["Second_Type"] = type_top[1][0]
+            kv["Second_Type_Share"] = f"{type_top[1][1]:.1f}"
+        if len(type_top) >= 3:
+            kv["Third_Type"] = type_top[2][0]
+            kv["Third_Type_Share"] = f"{type_top[2][1]:.1f}"
+
+        # By_Application (top 5 + aliases + others) - USE PERCENTAGE DATA
+        app_top, app_all = process_sheet_percentage_data("By_Application")
+        for i, (name, val) in enumerate(app_top[:5], start=1):
+            kv[f"Top_Application_{i}"] = name
+            kv[f"Top_Application_{i}_Share"] = f"{val:.1f}" if val is not None else ""
+        aliases = ["Top", "Second", "Third", "Fourth", "Fifth"]
+        for i, alias in enumerate(aliases, start=1):
+            if len(app_top) >= i:
+                kv[f"{alias}_Application"] = app_top[i-1][0]
+                kv[f"{alias}_Application_Share"] = f"{app_top[i-1][1]:.1f}"
+        if len(app_all) > 5:
+            kv["Other_Application_Share"] = f"{np.sum([v for _, v in app_all[5:]]):.1f}"
+
+        # By_EndUser (top 5 + aliases + others) - USE PERCENTAGE DATA
+        eu_top, eu_all = process_sheet_percentage_data("By_EndUser")
+        for i, (name, val) in enumerate(eu_top[:5], start=1):
+            kv[f"Top_EndUser_{i}"] = name
+            kv[f"Top_EndUser_{i}_Share"] = f"{val:.1f}" if val is not None else ""
+        aliases = ["Top", "Second", "Third", "Fourth", "Fifth"]
+        for i, alias in enumerate(aliases, start=1):
+            if len(eu_top) >= i:
+                kv[f"{alias}_EndUser"] = eu_top[i-1][0]
+                kv[f"{alias}_EndUser_Share"] = f"{eu_top[i-1][1]:.1f}"
+        if len(eu_all) > 5:
+            kv["Other_EndUser_Share"] = f"{np.sum([v for _, v in eu_all[5:]]):.1f}"
+
+        # By_Region (all dynamically, from % block) - USE PERCENTAGE DATA
+        reg_all, _ = process_sheet_percentage_data("By_Region")
+        for i, (name, val) in enumerate(reg_all, start=1):
+            kv[f"Top_Region_{i}"] = name
+            kv[f"Top_Region_{i}_Share"] = f"{val:.1f}" if val is not None else ""
+
+        # --- Narrative lines ---
+        kv["Market_Intro_Line"] = (
+            f"The {kv['Product'].lower()} market in {kv['Country']} reached a volume of "
+            f"{kv['Sales_Volume_Latest']} {kv['Unit']} in {kv['Latest_Year']}, "
+            f"{kv['Trend_Phrase']} at a CAGR of {kv['CAGR_2019_2024']} during 2019–2024."
+        )
+
+        kv["Market_Outlook_Line"] = (
+            f"Overall, the {kv['Product'].lower()} market in {kv['Country']} is expected to grow "
+            f"at a CAGR of {kv['CAGR_2025_2033']} during 2025–2033, reaching sales worth "
+            f"{kv['Sales_Volume_2033']} {kv['Unit']} by 2033."
+        )
+
+        # AI sections only need the kv above: build both prompts here (workbook
+        # reads stay on this thread), then run the two Gemini calls concurrently
+        keys = [key for key, wanted in zip(AI_SECTION_KEYS, (include_market_overview, include_overview_content)) if wanted]
+        kv.update(generate_ai_sections(build_ai_prompts(wb, kv, keys), metrics))
     
-    return kv, volumes
+        return kv, volumes
 
-def build_report_subtitle(excel_path):
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-
-    def collect_items(sheet_name):
-        ws = wb[sheet_name]
-        items = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            val = row[0]
-            if not val:
-                continue
-            val_str = str(val).strip()
-            low = val_str.lower()
-            # filter out headers / totals
-            if (
-                low.startswith("type") or low.startswith("source") or low.startswith("end user")
-                or low.startswith("region") or low.startswith("total")
-                or "market breakup" in low
-            ):
-                continue
-            items.append(val_str)
-        return items
+def _collect_subtitle_items(wb, sheet_name):
+    items = []
+    for row in wb.iter_rows(sheet_name, min_row=2):
+        val = row[0]
+        if not val:
+            continue
+        val_str = str(val).strip()
+        low = val_str.lower()
+        # filter out headers / totals
+        if (
+            low.startswith("type") or low.startswith("source") or low.startswith("end user")
+            or low.startswith("region") or low.startswith("total")
+            or "market breakup" in low
+        ):
+            continue
+        items.append(val_str)
+    return items
 
-    type_items = collect_items("By_Type")
-    app_items = collect_items("By_Application")
-    eu_items = collect_items("By_EndUser")
+def build_report_subtitle(excel_path):
+    with use_workbook(excel_path) as wb:
+        type_items = _collect_subtitle_items(wb, "By_Type")
+        app_items = _collect_subtitle_items(wb, "By_Application")
+        eu_items = _collect_subtitle_items(wb, "By_EndUser")
 
     # reorder Application items to match example (move "Others" to last)
     if "Others" in app_items:
@@ -537,11 +1407,11 @@ def build_report_subtitle(excel_path):
     return subtitle
 
 def build_list_from_sheet(excel_path, sheet_name, ignore_headers=True):
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    ws = wb[sheet_name]
+    with use_workbook(excel_path) as wb:
+        rows = list(wb.iter_rows(sheet_name, min_row=2, min_col=1, max_col=1))
     items = []
     seen = set()
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=1, values_only=True):
+    for row in rows:
         val = row[0]
         if not val:
             continue
@@ -561,7 +1431,6 @@ def build_list_from_sheet(excel_path, sheet_name, ignore_headers=True):
 # NEW FUNCTION: Create inline text versions of lists
 def create_inline_placeholders(excel_path):
     """Create inline (comma-separated) versions of list placeholders."""
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
     inline_kv = {}
     
     # Define the sheets we want to create inline versions for
@@ -572,23 +1441,24 @@ def create_inline_placeholders(excel_path):
         "By_Region": "By_Region_Inline"
     }
     
-    for sheet_name, inline_key in sheet_mappings.items():
-        if sheet_name in wb.sheetnames:
-            items = build_list_from_sheet(excel_path, sheet_name)
-            # Create comma-separated inline text
-            inline_text = ", ".join(items)
-            inline_kv[inline_key] = inline_text
-        else:
-            inline_kv[inline_key] = ""
+    with use_workbook(excel_path) as wb:
+        for sheet_name, inline_key in sheet_mappings.items():
+            if sheet_name in wb:
+                items = build_list_from_sheet(wb, sheet_name)
+                # Create comma-separated inline text
+                inline_text = ", ".join(items)
+                inline_kv[inline_key] = inline_text
+            else:
+                inline_kv[inline_key] = ""
     
     return inline_kv
 
 def build_toc_from_sheet(excel_path, sheet_name="Table_Contents"):
     """Return list of (text, level) from Table_Contents sheet."""
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    ws = wb[sheet_name]
+    with use_workbook(excel_path) as wb:
+        rows = list(wb.iter_rows(sheet_name, min_row=1, min_col=1, max_col=1))
     toc_items = []
-    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=1, values_only=True):
+    for row in rows:
         val = row[0]
         if not val:
             continue
@@ -848,17 +1718,19 @@ def replace_toc_in_slide(slide, toc_items, items_per_column=30):
     return leftovers
 
 
-def handle_toc_multi_slides(prs, toc_items, items_per_column=30):
-    """Distribute TOC across multiple slides until all items are placed."""
-    # find untouched template
-    toc_template = None
+def find_toc_template_slide(prs):
+    """First slide holding {{Table_Contents_Left}}, or None."""
     for slide in prs.slides:
         for shape in slide.shapes:
             if shape.has_text_frame and "{{Table_Contents_Left}}" in shape.text:
-                toc_template = slide
-                break
-        if toc_template:
-            break
+                return slide
+    return None
+
+def handle_toc_multi_slides(prs, toc_items, items_per_column=30, toc_template=None):
+    """Distribute TOC across multiple slides until all items are placed."""
+    # find untouched template (unless the caller already knows it)
+    if toc_template is None:
+        toc_template = find_toc_template_slide(prs)
     if not toc_template:
         return
 
@@ -1325,107 +2197,29 @@ def get_sheet_data_for_year(excel_path, sheet_name, year):
     Specifically looks for the SALES VOLUME section (not percentage section).
     Returns a dictionary {item_name: value}
     """
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    if sheet_name not in wb.sheetnames:
-        return {}
+    with use_workbook(excel_path) as wb:
+        if sheet_name not in wb:
+            return {}
+        segment = wb.segment_sheet(sheet_name)
     
-    ws = wb[sheet_name]
-    
-    # First, try to find the sales volume section (not the percentage section)
-    # Look for a header that contains the year but NOT "(%)""
-    header_row_idx = None
-    year_col_idx = None
-    
-    for row_idx in range(1, 20):  # Search first 20 rows
-        row = list(ws.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-        
-        # Skip rows that contain "%" - we want volume data, not percentage data
-        row_text = " ".join(str(cell) if cell else "" for cell in row)
-        if "(%" in row_text or " %" in row_text:
-            continue
-            
-        # Look for the year in this row
-        for col_idx, cell in enumerate(row):
-            if cell and str(year) in str(cell):
-                header_row_idx = row_idx
-                year_col_idx = col_idx
-                break
-        
-        if header_row_idx and year_col_idx is not None:
-            break
-    
-    if header_row_idx is None or year_col_idx is None:
+    header = segment.volume_header(year)
+    if header is None:
         print(f"Could not find year {year} in sales volume section of {sheet_name}")
         return {}
     
-    print(f"Found {year} data in {sheet_name} at row {header_row_idx}, column {year_col_idx}")
-    
-    # Extract data from rows after the header
-    data = {}
-    for row_idx in range(header_row_idx + 1, min(header_row_idx + 10, ws.max_row + 1)):
-        row = list(ws.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-        
-        # Stop if we hit an empty row or a row starting with "Total"
-        if not row[0] or "Total" in str(row[0]):
-            break
-            
-        # Stop if we hit another section (like percentage section)
-        row_text = " ".join(str(cell) if cell else "" for cell in row)
-        if "(%" in row_text or "Volume Share" in row_text or "Market Breakup" in row_text:
-            break
-        
-        item_name = str(row[0]).strip()
-        try:
-            value = float(row[year_col_idx]) if row[year_col_idx] is not None else 0
-            data[item_name] = value
-            print(f"  {item_name}: {value}")
-        except (ValueError, TypeError, IndexError):
-            continue
-    
-    return data
+    print(f"Found {year} data in {sheet_name} at row {header[0]}, column {header[1]}")
+    return dict(segment.volumes_for_year(year))
 
 def get_cagr_for_item(excel_path, sheet_name, item_name, start_year=2025, end_year=2033):
     """
     Calculate or extract CAGR for a specific item between two years.
-    First tries to find a CAGR column, then calculates if data is available.
-    """
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    if sheet_name not in wb.sheetnames:
-        return ""
-    
-    ws = wb[sheet_name]
-    
-    # Try to find existing CAGR column
-    for row in ws.iter_rows(min_row=1, max_row=5, values_only=True):
-        for col_idx, cell in enumerate(row):
-            if cell and "CAGR" in str(cell) and f"{start_year}-{end_year}" in str(cell):
-                # Found CAGR column, find the item's CAGR
-                for data_row in ws.iter_rows(min_row=6, values_only=True):
-                    if data_row[0] and str(data_row[0]).strip() == item_name:
-                        cagr_val = data_row[col_idx] if col_idx < len(data_row) else None
-                        if cagr_val:
-                            try:
-                                return f"{float(cagr_val)*100:.1f}%" if abs(float(cagr_val)) < 1 else f"{float(cagr_val):.1f}%"
-                            except:
-                                return str(cagr_val)
-    
-    # If no CAGR column found, try to calculate from start and end year data
-    try:
-        start_data = get_sheet_data_for_year(excel_path, sheet_name, start_year)
-        end_data = get_sheet_data_for_year(excel_path, sheet_name, end_year)
-        
-        if item_name in start_data and item_name in end_data:
-            start_val = start_data[item_name]
-            end_val = end_data[item_name]
-            
-            if start_val > 0 and end_val > 0:
-                years = end_year - start_year
-                cagr = ((end_val / start_val) ** (1/years) - 1) * 100
-                return f"{cagr:.1f}%"
-    except:
-        pass
-    
-    return ""
+    First tries to find a CAGR column, then calculates if data is available.
+    All items of the sheet are computed together (SegmentSheet.cagrs) and cached.
+    """
+    with use_workbook(excel_path) as wb:
+        if sheet_name not in wb:
+            return ""
+        return wb.segment_sheet(sheet_name).cagrs(start_year, end_year).get(item_name, "")
 
 def handle_table_row_expansion_enhanced(table, template_row_idx, col_idx, template_cell, items, placeholder, excel_path):
     """
@@ -1441,16 +2235,6 @@ def handle_table_row_expansion_enhanced(table, template_row_idx, col_idx, templa
     num_columns = len(table.rows[template_row_idx].cells)
     available_columns = num_columns - col_idx
     
-    # Get unit from Summary sheet
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
-    unit = ""
-    if "Summary" in wb.sheetnames:
-        summary_ws = wb["Summary"]
-        for row in summary_ws.iter_rows(values_only=True):
-            if row[0] and str(row[0]).strip().lower() == "unit":
-                unit = str(row[1]) if row[1] else ""
-                break
-    
     # Determine which sheet to get data from based on placeholder
     sheet_name = ""
     if "By_Type" in placeholder:
@@ -1462,9 +2246,19 @@ def handle_table_row_expansion_enhanced(table, template_row_idx, col_idx, templa
     elif "By_Region" in placeholder:
         sheet_name = "By_Region"
     
-    # Get data for 2024 and 2033
-    data_2024 = get_sheet_data_for_year(excel_path, sheet_name, 2024) if sheet_name else {}
-    data_2033 = get_sheet_data_for_year(excel_path, sheet_name, 2033) if sheet_name else {}
+    with use_workbook(excel_path) as wb:
+        # Get unit from Summary sheet
+        unit = ""
+        if "Summary" in wb:
+            for row in wb.rows("Summary"):
+                if row[0] and str(row[0]).strip().lower() == "unit":
+                    unit = str(row[1]) if row[1] else ""
+                    break
+        
+        # Get data for 2024 and 2033
+        data_2024 = get_sheet_data_for_year(wb, sheet_name, 2024) if sheet_name else {}
+        data_2033 = get_sheet_data_for_year(wb, sheet_name, 2033) if sheet_name else {}
+        cagrs = wb.segment_sheet(sheet_name).cagrs(2025, 2033) if sheet_name in wb else {}
     
     # Clear the template cell and put first item with appropriate data based on column count
     if items:
@@ -1473,7 +2267,7 @@ def handle_table_row_expansion_enhanced(table, template_row_idx, col_idx, templa
         # Get values for first item
         val_2024 = data_2024.get(first_item, 0)
         val_2033 = data_2033.get(first_item, 0)
-        cagr = get_cagr_for_item(excel_path, sheet_name, first_item) if sheet_name else ""
+        cagr = cagrs.get(first_item, "")
         
         # Adapt row data based on available columns
         if available_columns == 2:
@@ -1519,7 +2313,7 @@ def handle_table_row_expansion_enhanced(table, template_row_idx, col_idx, templa
                 # Get values for this item
                 val_2024 = data_2024.get(item, 0)
                 val_2033 = data_2033.get(item, 0)
-                cagr = get_cagr_for_item(excel_path, sheet_name, item) if sheet_name else ""
+                cagr = cagrs.get(item, "")
                 
                 # Adapt row data based on available columns
                 if available_columns == 2:
@@ -1940,6 +2734,65 @@ def apply_paragraph_formatting(paragraph, formatting):
             elif font_fmt.get('font_color_theme') is not None:
                 font.color.theme_color = font_fmt['font_color_theme']
 
+PLACEHOLDER_RE = re.compile(r"\{\{([^{}]+)\}\}")
+
+def substitute_placeholders_in_paragraph(paragraph, replacements, pattern=PLACEHOLDER_RE):
+    """
+    Replace, in one pass, every token of pattern in a paragraph whose key
+    (group 1: the name inside {{...}}) is in replacements. A token may span
+    several runs: its replacement goes into the run where it starts, the
+    rest of the token is cut from the following runs, and runs left empty by
+    that are dropped. Runs are edited in place, so each keeps its own <a:rPr>.
+    Returns the number of tokens replaced.
+    """
+    r_elms = paragraph._p.r_lst
+    texts = [r.text for r in r_elms]
+    full = "".join(texts)
+    if "{{" not in full and pattern is PLACEHOLDER_RE:
+        return 0
+    matches = [(m.start(), m.end(), replacements[m.group(1)]) for m in pattern.finditer(full)
+               if m.group(1) in replacements]
+    if not matches:
+        return 0
+
+    j = 0
+    start = 0
+    for r, text in zip(r_elms, texts):
+        end = start + len(text)
+        out = []
+        pos = start
+        touched = False
+        while j < len(matches) and matches[j][0] < end:
+            m_start, m_end, replacement = matches[j]
+            touched = True
+            if m_start >= start:
+                out.append(full[pos:m_start])
+                out.append(str(replacement) if replacement else "")
+            pos = max(pos, m_end)
+            if m_end > end:
+                break   # token continues into the next run
+            j += 1
+        if touched:
+            out.append(full[pos:end] if pos < end else "")
+            new_text = "".join(out)
+            if new_text:
+                r.text = new_text
+            else:
+                paragraph._p.remove(r)
+        start = end
+    return len(matches)
+
+def replace_placeholder_in_paragraph(paragraph, placeholder, replacement):
+    """
+    Replace every occurrence of placeholder in one paragraph, keeping the
+    formatting of the run that holds the start of the placeholder.
+    Returns True if anything was replaced.
+    """
+    if not placeholder or not paragraph._p.r_lst:
+        return False
+    literal = re.compile("(" + re.escape(placeholder) + ")")
+    return substitute_placeholders_in_paragraph(paragraph, {placeholder: replacement}, literal) > 0
+
 def replace_text_placeholders_in_slide(slide, placeholder, replacement):
     """
     Enhanced version that better preserves formatting when replacing placeholders.
@@ -1948,115 +2801,13 @@ def replace_text_placeholders_in_slide(slide, placeholder, replacement):
     if not placeholder:
         return
 
-    def replace_in_paragraph_runs(paragraph):
-        runs = paragraph.runs
-        if not runs:
-            return False
-
-        # Build concatenated string and track run positions
-        run_texts = [r.text or "" for r in runs]
-        full = "".join(run_texts)
-        
-        if placeholder not in full:
-            return False
-
-        replaced = False
-        
-        # Process each occurrence of the placeholder
-        while placeholder in full:
-            start = full.index(placeholder)
-            end = start + len(placeholder)
-
-            # Find which run contains the start of the placeholder
-            pos = 0
-            start_run_idx = -1
-            start_run_formatting = None
-            
-            for i, (run, text) in enumerate(zip(runs, run_texts)):
-                if pos <= start < pos + len(text):
-                    start_run_idx = i
-                    start_run_formatting = get_run_formatting(run)
-                    break
-                pos += len(text)
-
-            # Build run position metadata
-            pos = 0
-            runs_meta = []
-            for i, (r, t) in enumerate(zip(runs, run_texts)):
-                runs_meta.append({
-                    "run": r, 
-                    "text": t, 
-                    "start": pos, 
-                    "end": pos + len(t),
-                    "index": i
-                })
-                pos += len(t)
-
-            # Process each run that intersects with the placeholder
-            new_runs = []
-            current_pos = 0
-            for meta in runs_meta:
-                r = meta["run"]
-                t = meta["text"]
-                s = meta["start"]
-                e = meta["end"]
-                idx = meta["index"]
-
-                # Skip runs that don't intersect with placeholder
-                if e <= start or s >= end:
-                    new_runs.append((r, t))
-                    continue
-
-                # Calculate intersection within this run
-                run_rel_start = max(0, start - s)
-                run_rel_end = min(len(t), end - s)
-                
-                before = t[:run_rel_start]
-                after = t[run_rel_end:]
-
-                # Determine new text for this run
-                if s <= start < e:  # This run contains the start of placeholder
-                    new_text = before + replacement
-                    if end <= e:  # Placeholder also ends in this run
-                        new_text += after
-                    
-                    # Update the run text and preserve formatting
-                    r.text = new_text
-                    if start_run_formatting and idx == start_run_idx:
-                        apply_run_formatting(r, start_run_formatting)
-                    new_runs.append((r, new_text))
-                
-                elif s < end <= e:  # This run contains the end of placeholder
-                    r.text = after
-                    new_runs.append((r, after))
-                else:  # This run is completely inside the placeholder
-                    r.text = ""
-                    new_runs.append((r, ""))
-
-            # Rebuild runs to ensure formatting is maintained across the replacement
-            for i in reversed(range(len(paragraph.runs))):
-                paragraph._element.remove(paragraph.runs[i]._r)
-
-            for run, text in new_runs:
-                if text:
-                    new_run = paragraph.add_run()
-                    new_run.text = text
-                    apply_run_formatting(new_run, get_run_formatting(run))
-
-            # Rebuild for next iteration
-            run_texts = [r.text or "" for r in paragraph.runs]
-            full = "".join(run_texts)
-            replaced = True
-
-        return replaced
-
     # Process all shapes in the slide
     for shape in slide.shapes:
         # Handle text frames
         if getattr(shape, "has_text_frame", False):
             tf = shape.text_frame
             for para in tf.paragraphs:
-                replace_in_paragraph_runs(para)
+                replace_placeholder_in_paragraph(para, placeholder, replacement)
 
         # Handle tables
         if getattr(shape, "has_table", False):
@@ -2066,7 +2817,93 @@ def replace_text_placeholders_in_slide(slide, placeholder, replacement):
                     if not getattr(cell, "text_frame", None):
                         continue
                     for para in cell.text_frame.paragraphs:
-                        replace_in_paragraph_runs(para)
+                        replace_placeholder_in_paragraph(para, placeholder, replacement)
+
+class PlaceholderIndex:
+    """
+    Every {{Key}} token of a presentation, found in one scan.
+
+    Each hit records the slide, the shape, the paragraph, the character span
+    inside the paragraph text, the (first, last) run indexes it covers and,
+    for tables, the (row, col) of the cell. Replacement passes then visit only
+    these locations instead of walking every shape once per key.
+    """
+
+    def __init__(self, prs):
+        self.prs = prs
+        self._hits = {}   # slide_id -> [hit, ...]
+        for slide in prs.slides:
+            self.rescan_slide(slide)
+
+    def rescan_slide(self, slide):
+        """Re-index one slide after its structure changed (rows/paragraphs/shapes added)."""
+        hits = []
+        for shape in slide.shapes:
+            if getattr(shape, "has_text_frame", False):
+                for para in shape.text_frame.paragraphs:
+                    hits.extend(self._scan_paragraph(slide, shape, para, None))
+            if getattr(shape, "has_table", False):
+                for r_idx, row in enumerate(shape.table.rows):
+                    for c_idx, cell in enumerate(row.cells):
+                        if not getattr(cell, "text_frame", None):
+                            continue
+                        for para in cell.text_frame.paragraphs:
+                            hits.extend(self._scan_paragraph(slide, shape, para, (r_idx, c_idx)))
+        self._hits[slide.slide_id] = hits
+
+    @staticmethod
+    def _scan_paragraph(slide, shape, para, cell):
+        run_texts = [r.text or "" for r in para.runs]
+        full = "".join(run_texts)
+        if "{{" not in full:
+            return []
+        # run index covering each character offset
+        run_ends = []
+        pos = 0
+        for text in run_texts:
+            pos += len(text)
+            run_ends.append(pos)
+        hits = []
+        for m in PLACEHOLDER_RE.finditer(full):
+            first = next(i for i, e in enumerate(run_ends) if e > m.start())
+            last = next(i for i, e in enumerate(run_ends) if e >= m.end())
+            hits.append({
+                "key": m.group(1),
+                "slide": slide,
+                "shape": shape,
+                "paragraph": para,
+                "cell": cell,
+                "start": m.start(),
+                "end": m.end(),
+                "runs": (first, last),
+            })
+        return hits
+
+    def hits(self, slide=None, key=None):
+        """Hits on one slide (or all slides), optionally only for key."""
+        groups = [self._hits.get(slide.slide_id, [])] if slide is not None else self._hits.values()
+        return [h for group in groups for h in group if key is None or h["key"] == key]
+
+    def keys_on(self, slide):
+        """Set of placeholder keys present on a slide."""
+        return {h["key"] for h in self._hits.get(slide.slide_id, [])}
+
+    def slides_with(self, key):
+        """Slides containing key, in presentation order."""
+        return [slide for slide in self.prs.slides
+                if any(h["key"] == key for h in self._hits.get(slide.slide_id, []))]
+
+def replace_indexed_text_placeholders(index, slide, kv):
+    """
+    Replace kv placeholders on one slide, touching only indexed paragraphs;
+    all tokens of a paragraph are substituted in a single pass.
+    """
+    paragraphs = {}
+    for hit in index.hits(slide):
+        if hit["key"] in kv:
+            paragraphs.setdefault(hit["paragraph"]._p, hit["paragraph"])
+    for para in paragraphs.values():
+        substitute_placeholders_in_paragraph(para, kv)
 
 def add_row_to_table(table, template_row_idx):
     """Clone a row in the table at the end, using template_row_idx as format."""
@@ -2128,117 +2965,194 @@ def normalize_products(raw):
     cleaned = [p.strip().strip('"').strip("'") for p in parts if p.strip()]
     return cleaned
 
-# --- helper: quick Wikipedia-based founding year lookup (fallback) ---
-def fetch_founding_from_wikipedia(company_name, timeout=8):
+# --- helper: Wikipedia lookups (fallback for founding years) ---
+WIKIPEDIA_API_URL = os.environ.get("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+
+FOUNDED_RE = re.compile(r'(?:Founded|Founded in|founded in|Established|established|Founded:|Founded -)\D{0,30}(\d{4})', re.I)
+
+def _founding_year_from_extract(extract):
+    """Founding year in a page's plaintext extract ("" if none)."""
+    # look for 'Founded', 'Established', 'founded in' patterns
+    m = FOUNDED_RE.search(extract)
+    if m:
+        return m.group(1)
+
+    # fallback: first plausible 4-digit year in whole extract
+    m2 = re.search(r'(\b(17|18|19|20)\d{2}\b)', extract)
+    if m2:
+        y = int(m2.group(1))
+        if 1700 <= y <= datetime.datetime.now().year:
+            return str(y)
+    return ""
+
+class WikipediaClient:
     """
-    Try to find a founding year from the company's Wikipedia page.
-    Returns a string year (e.g. "1897") or "" if not found.
+    MediaWiki API client on one pooled keep-alive session, retrying with
+    backoff on connection errors and 429/5xx answers. api_url (or the
+    WIKIPEDIA_API_URL env var) can point at a local stub server.
     """
-    try:
-        API = "https://en.wikipedia.org/w/api.php"
-        # 1) search for the page
-        params = {"action": "query", "list": "search", "srsearch": company_name, "format": "json", "srlimit": 1}
-        r = requests.get(API, params=params, timeout=timeout)
+
+    MAX_TITLES = 20  # API limit for intro extracts per query
+
+    def __init__(self, api_url=None, session=None, retries=3, backoff=0.5, pool_size=10):
+        self.api_url = api_url or WIKIPEDIA_API_URL
+        self.session = session or self._make_session(retries, backoff, pool_size)
+
+    @staticmethod
+    def _make_session(retries, backoff, pool_size):
+        session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET"]))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = "ppt-crafter/1.0 (report generator)"
+        return session
+
+    def _query(self, params, timeout):
+        RATE_LIMITS["wikipedia"].acquire()
+        r = self.session.get(self.api_url, params=dict(params, action="query", format="json"), timeout=timeout)
         r.raise_for_status()
-        data = r.json()
-        hits = data.get("query", {}).get("search", [])
-        if not hits:
-            return ""
-        title = hits[0]["title"]
-
-        # 2) fetch plaintext extract
-        params2 = {"action": "query", "prop": "extracts", "explaintext": 1, "titles": title, "format": "json", "redirects": 1}
-        r2 = requests.get(API, params=params2, timeout=timeout)
-        r2.raise_for_status()
-        pages = r2.json().get("query", {}).get("pages", {})
-        if not pages:
-            return ""
+        return r.json().get("query", {})
 
-        # get extract text
-        page = next(iter(pages.values()))
-        extract = page.get("extract", "")
+    def search_title(self, text, timeout=8):
+        """Title of the best search hit for text ("" if none)."""
+        hits = self._query({"list": "search", "srsearch": text, "srlimit": 1}, timeout).get("search", [])
+        return hits[0]["title"] if hits else ""
 
-        # look for 'Founded', 'Established', 'founded in' patterns
-        m = re.search(r'(?:Founded|Founded in|founded in|Established|established|Founded:|Founded -)\D{0,30}(\d{4})', extract, re.I)
-        if m:
-            year = m.group(1)
-            return year
+    def extracts(self, titles, intro=False, timeout=8):
+        """
+        {title: plaintext extract}. Intro extracts are fetched up to MAX_TITLES
+        per query; whole-page extracts can only be fetched one title at a time.
+        """
+        out = {}
+        titles = list(dict.fromkeys(t for t in titles if t))
+        step = self.MAX_TITLES if intro else 1
+        for i in range(0, len(titles), step):
+            chunk = titles[i:i + step]
+            params = {"prop": "extracts", "explaintext": 1, "titles": "|".join(chunk), "redirects": 1}
+            if intro:
+                params.update({"exintro": 1, "exlimit": len(chunk)})
+            q = self._query(params, timeout)
+
+            # follow title normalization/redirects back to the requested titles
+            alias = {e["from"]: e["to"] for e in q.get("normalized", []) + q.get("redirects", [])}
+            by_title = {page.get("title"): page.get("extract", "") for page in q.get("pages", {}).values()}
+            for title in chunk:
+                final, seen = title, set()
+                while final in alias and final not in seen:
+                    seen.add(final)
+                    final = alias[final]
+                out[title] = by_title.get(final, "")
+        return out
+
+    def founding_years(self, company_names, timeout=8):
+        """
+        {company: founding year or ""}: one search per company, then the intro
+        extracts of all pages in one query. A page whose intro does not mention
+        a founding date falls back to its full extract.
+        """
+        titles = {}
+        for name in company_names:
+            try:
+                titles[name] = self.search_title(name, timeout)
+            except Exception:
+                titles[name] = ""
+
+        try:
+            intros = self.extracts(titles.values(), intro=True, timeout=timeout)
+        except Exception:
+            intros = {}
 
-        # fallback: first plausible 4-digit year in whole extract
-        m2 = re.search(r'(\b(17|18|19|20)\d{2}\b)', extract)
-        if m2:
-            y = int(m2.group(1))
-            if 1700 <= y <= datetime.datetime.now().year:
-                return str(y)
+        years = {}
+        for name, title in titles.items():
+            years[name] = ""
+            if not title:
+                continue
+            try:
+                m = FOUNDED_RE.search(intros.get(title, ""))
+                if m:
+                    years[name] = m.group(1)
+                else:
+                    full = self.extracts([title], timeout=timeout).get(title, "")
+                    years[name] = _founding_year_from_extract(full)
+            except Exception:
+                years[name] = ""
+        return years
+
+_WIKIPEDIA_CLIENT = None
+_WIKIPEDIA_CLIENT_LOCK = threading.Lock()
+
+def wikipedia_client():
+    """Shared WikipediaClient (created on first use)."""
+    global _WIKIPEDIA_CLIENT
+    with _WIKIPEDIA_CLIENT_LOCK:
+        if _WIKIPEDIA_CLIENT is None:
+            _WIKIPEDIA_CLIENT = WikipediaClient()
+        return _WIKIPEDIA_CLIENT
+
+def set_wikipedia_client(client):
+    """Swap the shared client (e.g. one pointed at a stub server); None resets it."""
+    global _WIKIPEDIA_CLIENT
+    with _WIKIPEDIA_CLIENT_LOCK:
+        _WIKIPEDIA_CLIENT = client
 
+def fetch_founding_from_wikipedia(company_name, timeout=8):
+    """
+    Try to find a founding year from the company's Wikipedia page.
+    Returns a string year (e.g. "1897") or "" if not found.
+    """
+    try:
+        return wikipedia_client().founding_years([company_name], timeout=timeout).get(company_name, "")
     except Exception:
         return ""
-    return ""
 
-def fetch_company_details(company_name, use_ai=True, ai_timeout=8):
-    details = {
+def _blank_company_details():
+    return {
         "founding_year": "",
         "headquarters": "",
         "website": "",
         "products_offered": []
     }
 
-    if use_ai:
-        try:
-            prompt = f"""
-            Provide very short structured details about the company "{company_name}".
-            Return JSON with keys: founding_year, headquarters, website, products_offered.
-            Example:
-            {{
-              "founding_year": "1897",
-              "headquarters": "Tokyo, Japan",
-              "website": "https://www.example.com",
-              "products_offered": ["Chemicals", "Plastics"]
-            }}
-            Keep it concise and factual.
-            """
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-
-            text = getattr(response, "text", "").strip()
-
-            # --- Clean Gemini output ---
-            # remove code fences if present
-            if text.startswith("```"):
-                text = re.sub(r"^```[a-zA-Z]*\n", "", text)
-                text = re.sub(r"\n```$", "", text)
-                text = text.strip()
-
-            # Try parsing JSON
-            parsed = {}
-            try:
-                parsed = json.loads(text)
-            except Exception:
-                # fallback: try to extract {...} JSON substring
-                m = re.search(r"\{.*\}", text, flags=re.S)
-                if m:
-                    try:
-                        parsed = json.loads(m.group(0))
-                    except:
-                        pass
+def _parse_ai_json(text):
+    """JSON object/array from a Gemini answer (code fences and chatter tolerated), or None."""
+    text = text.strip()
 
-            # fallback if still not JSON
-            if not isinstance(parsed, dict):
-                parsed = {}
+    # --- Clean Gemini output ---
+    # remove code fences if present
+    if text.startswith("```"):
+        text = re.sub(r"^```[a-zA-Z]*\n", "", text)
+        text = re.sub(r"\n```$", "", text)
+        text = text.strip()
 
-            # merge parsed fields
-            details["founding_year"] = str(parsed.get("founding_year", "") or "")
-            details["headquarters"] = str(parsed.get("headquarters", "") or "")
-            details["website"] = str(parsed.get("website", "") or "")
-            details["products_offered"] = parsed.get("products_offered", [])
-        except Exception as e:
-            # non-fatal - we will try fallbacks below
-            print("⚠️ AI lookup failed or timed out:", e)
+    # Try parsing JSON
+    try:
+        return json.loads(text)
+    except Exception:
+        # fallback: try to extract {...} / [...] JSON substring
+        for pattern in (r"\[.*\]", r"\{.*\}"):
+            m = re.search(pattern, text, flags=re.S)
+            if m:
+                try:
+                    return json.loads(m.group(0))
+                except:
+                    pass
+    return None
 
-    # 2) Normalize products into a list
-    details["products_offered"] = normalize_products(details.get("products_offered", ""))
+def _details_from_ai(parsed):
+    """Company details dict from one parsed AI JSON object."""
+    details = _blank_company_details()
+    if not isinstance(parsed, dict):
+        return details
+    details["founding_year"] = str(parsed.get("founding_year", "") or "")
+    details["headquarters"] = str(parsed.get("headquarters", "") or "")
+    details["website"] = str(parsed.get("website", "") or "")
+    details["products_offered"] = parsed.get("products_offered", [])
+    return details
 
-    # 3) Validate founding_year — must be a 4-digit plausible year
+def _founding_year_candidate(details):
+    """(year as int or None, whether it is plausible) for the AI founding_year."""
     fy_raw = details.get("founding_year", "")
     fy_candidate = None
     if fy_raw:
@@ -2250,9 +3164,23 @@ def fetch_company_details(company_name, use_ai=True, ai_timeout=8):
                 fy_candidate = None
 
     now_year = datetime.datetime.now().year
-    if not fy_candidate or fy_candidate < 1700 or fy_candidate > now_year:
+    plausible = bool(fy_candidate) and 1700 <= fy_candidate <= now_year
+    return fy_candidate, plausible
+
+def _finalize_company_details(company_name, details, use_cache=True, wiki_year=None):
+    """
+    Normalize AI details, fall back to Wikipedia for the founding year and cache
+    the result. wiki_year is the Wikipedia answer when it was fetched up front.
+    """
+    # 2) Normalize products into a list
+    details["products_offered"] = normalize_products(details.get("products_offered", ""))
+
+    # 3) Validate founding_year — must be a 4-digit plausible year
+    fy_candidate, plausible = _founding_year_candidate(details)
+    if not plausible:
         # fallback to Wikipedia
-        wiki_year = fetch_founding_from_wikipedia(company_name)
+        if wiki_year is None:
+            wiki_year = fetch_founding_from_wikipedia(company_name)
         if wiki_year:
             details["founding_year"] = wiki_year
         else:
@@ -2264,11 +3192,164 @@ def fetch_company_details(company_name, use_ai=True, ai_timeout=8):
     # 4) final normalization: ensure products_offered is list of strings
     details["products_offered"] = normalize_products(details.get("products_offered", ""))
 
+    # only remember lookups that found something, so failures are retried next time
+    if use_cache and any(details.values()):
+        COMPANY_CACHE.set(normalize_company_name(company_name), details)
+
     return details
 
-def distribute_company_names_across_template_slides(prs, placeholder, items, duplicate_if_needed=True):
+def fetch_company_details(company_name, use_ai=True, ai_timeout=8, use_cache=True):
+    if use_cache:
+        cached = COMPANY_CACHE.get(normalize_company_name(company_name))
+        if cached is not None:
+            return cached
+
+    details = _blank_company_details()
+
+    if use_ai:
+        try:
+            prompt = f"""
+            Provide very short structured details about the company "{company_name}".
+            Return JSON with keys: founding_year, headquarters, website, products_offered.
+            Example:
+            {{
+              "founding_year": "1897",
+              "headquarters": "Tokyo, Japan",
+              "website": "https://www.example.com",
+              "products_offered": ["Chemicals", "Plastics"]
+            }}
+            Keep it concise and factual.
+            """
+            text = ai_generate_text(prompt, timeout=ai_timeout)
+            details = _details_from_ai(_parse_ai_json(text))
+        except Exception as e:
+            # non-fatal - we will try fallbacks below
+            print("⚠️ AI lookup failed or timed out:", e)
+
+    return _finalize_company_details(company_name, details, use_cache)
+
+COMPANY_BATCH_SIZE = int(os.environ.get("COMPANY_BATCH_SIZE", "10"))
+
+def fetch_company_details_batch(company_names, use_ai=True, ai_timeout=30, use_cache=True, stop=None):
+    """
+    Details for several companies from a single Gemini prompt (JSON array back).
+    Cached companies are skipped; any company missing from the answer is retried
+    on its own with fetch_company_details. Returns {name: details}.
+    Once the threading.Event stop is set, no further lookups are started and
+    the companies resolved so far are returned.
+    """
+    def stopped():
+        return stop is not None and stop.is_set()
+
+    results = {}
+    pending = []
+    for name in company_names:
+        cached = COMPANY_CACHE.get(normalize_company_name(name)) if use_cache else None
+        if cached is not None:
+            results[name] = cached
+        else:
+            pending.append(name)
+    if not pending or stopped():
+        return results
+
+    answered = {}
+    if use_ai:
+        try:
+            prompt = f"""
+            Provide very short structured details about each company in COMPANIES_JSON.
+            Return a JSON array with one object per company and keys: name (exactly as given),
+            founding_year, headquarters, website, products_offered.
+            COMPANIES_JSON: {json.dumps(pending, ensure_ascii=False)}
+            Example:
+            [
+              {{
+                "name": "Example Corp",
+                "founding_year": "1897",
+                "headquarters": "Tokyo, Japan",
+                "website": "https://www.example.com",
+                "products_offered": ["Chemicals", "Plastics"]
+              }}
+            ]
+            Keep it concise and factual.
+            """
+            parsed = _parse_ai_json(ai_generate_text(prompt, timeout=ai_timeout))
+            for entry in parsed if isinstance(parsed, list) else []:
+                if isinstance(entry, dict) and entry.get("name"):
+                    answered[normalize_company_name(entry["name"])] = entry
+        except Exception as e:
+            print("⚠️ Batch AI lookup failed or timed out:", e)
+
+    # founding-year fallback for every answered company at once
+    found = {name: _details_from_ai(answered[normalize_company_name(name)])
+             for name in pending if normalize_company_name(name) in answered}
+    need_wiki = [name for name, details in found.items() if not _founding_year_candidate(details)[1]]
+    wiki_years = {}
+    if need_wiki and not stopped():
+        try:
+            wiki_years = wikipedia_client().founding_years(need_wiki)
+        except Exception:
+            wiki_years = {}
+
+    for name in pending:
+        if name not in found:
+            if stopped():
+                continue
+            # not in the batch answer: one prompt for this company alone
+            results[name] = fetch_company_details(name, use_ai=use_ai, use_cache=use_cache)
+        else:
+            results[name] = _finalize_company_details(name, found[name], use_cache,
+                                                      wiki_year=wiki_years.get(name, ""))
+    return results
+
+COMPANY_ENRICH_WORKERS = int(os.environ.get("COMPANY_ENRICH_WORKERS", "8"))
+COMPANY_ENRICH_DEADLINE = float(os.environ.get("COMPANY_ENRICH_DEADLINE", "120"))  # seconds for all companies
+
+def enrich_companies(company_names, use_ai=True, workers=None, deadline=None, batch_size=None, metrics=None):
+    """
+    Fetch details for every company in parallel: companies go to Gemini in
+    batches of batch_size, batches run concurrently (bounded by workers; each
+    backend is paced by RATE_LIMITS). Returns {name: details}. Companies still
+    unresolved when the deadline passes get blank details. Every company left
+    blank (deadline, failed lookups) is counted as "companies_unresolved" in
+    metrics, if given.
+    """
+    workers = COMPANY_ENRICH_WORKERS if workers is None else workers
+    deadline = COMPANY_ENRICH_DEADLINE if deadline is None else deadline
+    batch_size = max(1, COMPANY_BATCH_SIZE if batch_size is None else batch_size)
+    names = list(dict.fromkeys(company_names))
+    results = {name: _blank_company_details() for name in names}
+    if not names:
+        return results
+
+    batches = [names[i:i + batch_size] for i in range(0, len(names), batch_size)]
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches))))
+    stop = threading.Event()   # tells batches still running past the deadline to give up
+    futures = {executor.submit(fetch_company_details_batch, batch, use_ai, stop=stop): batch for batch in batches}
+    try:
+        done, pending = wait(futures, timeout=deadline)
+        for future in done:
+            try:
+                results.update(future.result())
+            except Exception as e:
+                print(f"⚠️ Company lookup failed for {', '.join(futures[future])}: {e}")
+        if pending:
+            unresolved = sum(len(futures[future]) for future in pending)
+            print(f"⚠️ Company enrichment deadline hit; {unresolved} of {len(names)} left blank")
+            for future in pending:
+                future.cancel()
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    if metrics is not None:
+        metrics.count("companies_unresolved", sum(1 for details in results.values() if not any(details.values())))
+    return results
+
+def distribute_company_names_across_template_slides(prs, placeholder, items, duplicate_if_needed=True, slides=None,
+                                                    company_details=None):
     """
     Fill company details dynamically in table (using Gemini for details).
+    slides limits the template search (e.g. PlaceholderIndex.slides_with); default is every slide.
+    company_details ({name: details}) skips the lookups, e.g. when enrich_companies already ran.
     Columns assumed as:
       col_idx = Company Name
       col_idx+1 = Founding Year
@@ -2279,7 +3360,10 @@ def distribute_company_names_across_template_slides(prs, placeholder, items, dup
 
     # 1) collect templates (in slide order)
     templates = []
+    candidates = set(s.slide_id for s in slides) if slides is not None else None
     for s_idx, slide in enumerate(prs.slides):
+        if candidates is not None and slide.slide_id not in candidates:
+            continue
         for shp in slide.shapes:
             if not getattr(shp, "has_table", False):
                 continue
@@ -2313,6 +3397,11 @@ def distribute_company_names_across_template_slides(prs, placeholder, items, dup
     total_capacity = sum(t["capacity"] for t in templates)
     print(f"Found {len(templates)} template slide(s), capacities:", [t["capacity"] for t in templates], "â†’ total {total_capacity}")
 
+    # Look up every company that will be placed up front, in parallel
+    if company_details is None:
+        to_fill = items if duplicate_if_needed else items[:total_capacity]
+        company_details = enrich_companies(to_fill, use_ai=True)
+
     def _fill_table_object(tbl_obj, col_idx, header_offset, chunk_items, formatting):
         """
         Fills a chunk of companies into table tbl_obj starting at header_offset row,
@@ -2323,8 +3412,8 @@ def distribute_company_names_across_template_slides(prs, placeholder, items, dup
             if row_index >= len(tbl_obj.rows):
                 continue
 
-            # Get details (AI + fallback)
-            details = fetch_company_details(company, use_ai=True)
+            # Details were fetched up front (AI + fallback); blank if unresolved
+            details = company_details.get(company) or _blank_company_details()
 
             # Values for first four columns
             values = [
@@ -2410,7 +3499,7 @@ def distribute_company_names_across_template_slides(prs, placeholder, items, dup
 
 def update_charts_in_slide(slide, volumes, unit, historical_years=[2019, 2020, 2021, 2022, 2023, 2024], forecast_years=[2025, 2026, 2027, 2028, 2029, 2030, 2031, 2032, 2033]):
     """
-    Update bar chart series data from volumes dict.
+    Update bar chart series data from volumes (a TimeSeries or a {year: value} dict).
     Assumes single series per chart; historical/forecast based on categories containing years.
     """
     for shape in slide.shapes:
@@ -2451,13 +3540,17 @@ def update_charts_in_slide(slide, volumes, unit, historical_years=[2019, 2020, 2
             continue
         
         years = historical_years if is_historical else forecast_years
+        if isinstance(volumes, TimeSeries):
+            year_values = volumes.at(years, fill=0).tolist()
+        else:
+            year_values = [volumes.get(y, 0) for y in years]
         
         # Update existing series values
         try:
             if chart.series and len(chart.series) > 0:
                 series = chart.series[0]
                 # Update the values
-                new_values = [volumes.get(y, 0) for y in years]
+                new_values = year_values
                 
                 # Try to update values directly
                 try:
@@ -2479,7 +3572,7 @@ def update_charts_in_slide(slide, volumes, unit, historical_years=[2019, 2020, 2
                 # No existing series, create new data
                 data = CategoryChartData()
                 data.categories = [str(y) for y in years]
-                data.add_series("Volume", tuple(volumes.get(y, 0) for y in years))
+                data.add_series("Volume", tuple(year_values))
                 chart.replace_data(data)
                 print(f"Created new {'historical' if is_historical else 'forecast'} chart with {len(years)} data points")
                 
@@ -2487,65 +3580,630 @@ def update_charts_in_slide(slide, volumes, unit, historical_years=[2019, 2020, 2
             print(f"Error updating chart: {e}")
             continue
 
-# --------------- main ---------------
+# --------------- template cache ---------------
+
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.environ.get("TEMPLATE_CACHE_MAX_ENTRIES", "8"))
+TEMPLATE_CACHE_MAX_BYTES = int(os.environ.get("TEMPLATE_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+class CompiledTemplate:
+    """
+    A .pptx template parsed once, plus what every run would otherwise rediscover:
+    which slides hold which placeholders, the TOC template slide and the chart
+    slides. Locations are stored as slide ids, which survive the deep copy
+    handed to each run.
+
+    The presentation that gets copied is never read from: python-pptx caches
+    wrappers around sub-elements (slide lists, shapes) on first access, and
+    deepcopy would give those cached wrappers detached copies of the XML.
+    The scan runs on a second parse instead.
+    """
+
+    def __init__(self, blob):
+        self.sha256 = hashlib.sha256(blob).hexdigest()
+        self.size = len(blob)
+        self.presentation = Presentation(io.BytesIO(blob))
+        self._copy_lock = threading.Lock()
+        scanned = Presentation(io.BytesIO(blob))
+
+        index = PlaceholderIndex(scanned)
+        self.placeholder_slides = {}     # key -> [slide_id, ...]
+        for hit in index.hits():
+            slide_id = hit["slide"].slide_id
+            slide_ids = self.placeholder_slides.setdefault(hit["key"], [])
+            if slide_id not in slide_ids:
+                slide_ids.append(slide_id)
+
+        self.slide_keys = {}             # slide_id -> [key, ...] (template slides only)
+        for key, slide_ids in self.placeholder_slides.items():
+            for slide_id in slide_ids:
+                self.slide_keys.setdefault(slide_id, []).append(key)
+
+        toc_slide = find_toc_template_slide(scanned)
+        self.toc_slide_id = toc_slide.slide_id if toc_slide is not None else None
+        self.chart_slide_ids = [slide.slide_id for slide in scanned.slides
+                                if any(getattr(shape, "has_chart", False) for shape in slide.shapes)]
+
+        # Slides rendered in place (the TOC and company slides are duplicated
+        # per run instead): these can be restored from a previous output
+        duplicated = {self.toc_slide_id} | set(self.placeholder_slides.get("Company_Name_List", []))
+        self.reusable_slide_ids = [slide_id for slide_id in self.slide_keys.keys() | set(self.chart_slide_ids)
+                                   if slide_id not in duplicated]
+
+    def new_presentation(self):
+        """An independent copy of the parsed template for one run."""
+        # request and job threads share this tree; lxml proxies are not safe to build concurrently
+        with self._copy_lock:
+            return deepcopy(self.presentation)
+
+    def slide(self, prs, slide_id):
+        """The slide with slide_id in a copy made by new_presentation(), or None."""
+        if slide_id is None:
+            return None
+        return prs.slides.get(slide_id)
+
+_TEMPLATE_CACHE = OrderedDict()   # sha256 -> CompiledTemplate, least recently used first
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+def _read_source_bytes(source):
+    """Bytes of a path, a bytes object or a file-like object."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+def compile_template(source):
+    """
+    CompiledTemplate for a template path/bytes/file, from the LRU cache when
+    a template with the same SHA-256 was compiled before.
+    """
+    blob = _read_source_bytes(source)
+    key = hashlib.sha256(blob).hexdigest()
+    with _TEMPLATE_CACHE_LOCK:
+        compiled = _TEMPLATE_CACHE.get(key)
+        if compiled is not None:
+            _TEMPLATE_CACHE.move_to_end(key)
+            return compiled
+
+    compiled = CompiledTemplate(blob)
+    with _TEMPLATE_CACHE_LOCK:
+        _TEMPLATE_CACHE[key] = compiled
+        _TEMPLATE_CACHE.move_to_end(key)
+        # evict least recently used entries, always keeping the newest one
+        while len(_TEMPLATE_CACHE) > 1 and (
+            len(_TEMPLATE_CACHE) > TEMPLATE_CACHE_MAX_ENTRIES
+            or sum(t.size for t in _TEMPLATE_CACHE.values()) > TEMPLATE_CACHE_MAX_BYTES
+        ):
+            _TEMPLATE_CACHE.popitem(last=False)
+    return compiled
+
+def clear_template_cache():
+    with _TEMPLATE_CACHE_LOCK:
+        _TEMPLATE_CACHE.clear()
+
+# --------------- incremental regeneration ---------------
+
+REPORT_STATE = PersistentCache(CACHE_DB_PATH, "report_state",
+                               ttl=float(os.environ.get("REPORT_STATE_TTL_DAYS", "30")) * 86400,
+                               max_entries=int(os.environ.get("REPORT_STATE_MAX_ENTRIES", "200")))
+
+_generator_sha = []
+
+def report_state_key(template, title):
+    """Previous runs are matched by generator code + template content + report title."""
+    if not _generator_sha:
+        with open(os.path.abspath(__file__), "rb") as f:
+            _generator_sha.append(hashlib.sha256(f.read()).hexdigest())
+    return hashlib.sha256(f"{_generator_sha[0]}\n{template.sha256}\n{title or ''}".encode("utf-8")).hexdigest()
+
+def slide_input_signatures(template, wb, kv, list_placeholders, volumes, deferred=None):
+    """
+    {slide_id: hash of every input the template slide renders from} for the
+    reusable slides: its kv values, list items (plus the 2024/2033/CAGR figures
+    expansion rows pull from the sheet) and chart series. deferred stands in
+    for values not produced yet ({key: identity}, e.g. AI prompt fingerprints).
+    """
+    deferred = deferred or {}
+    signatures = {}
+    for slide_id in template.reusable_slide_ids:
+        inputs = {}
+        for key in sorted(template.slide_keys.get(slide_id, [])):
+            list_key = key[:-len("_EXPAND")] if key.endswith("_EXPAND") else key
+            if list_key in list_placeholders:
+                sheet_name = list_key[:-len("_List")]
+                segment = wb.segment_sheet(sheet_name) if sheet_name in wb else None
+                inputs[key] = [list_placeholders[list_key],
+                               segment.volumes_for_year(2024) if segment else None,
+                               segment.volumes_for_year(2033) if segment else None,
+                               segment.cagrs(2025, 2033) if segment else None]
+            elif key in deferred:
+                inputs[key] = deferred[key]
+            else:
+                inputs[key] = kv.get(key)
+        if slide_id in template.chart_slide_ids:
+            inputs["charts"] = [sorted(volumes.items()), kv.get("Unit")]
+        blob = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+        signatures[str(slide_id)] = hashlib.sha256(blob).hexdigest()
+    return signatures
+
+_R_ID = qn("r:id")
+
+def snapshot_slide(slide):
+    """
+    Rendered slide XML plus its charts (chart XML and embedded workbook, keyed
+    by the slide's relationship id), as JSON-friendly data for restore_slide.
+    """
+    charts = {}
+    for chart_ref in slide._element.iter(qn("c:chart")):
+        rId = chart_ref.get(_R_ID)
+        chart_part = slide.part.related_part(rId)
+        xlsx_rId = chart_part._element.xlsx_part_rId
+        xlsx = chart_part.related_part(xlsx_rId).blob if xlsx_rId else None
+        charts[rId] = {
+            "xml": etree.tostring(chart_part._element, encoding="unicode"),
+            "xlsx": base64.b64encode(xlsx).decode("ascii") if xlsx is not None else None,
+        }
+    return {"xml": etree.tostring(slide._element, encoding="unicode"), "charts": charts}
+
+def _relationship_ids(element):
+    rel_prefix = "{" + _REL_NS + "}"
+    return {value for node in element.iter() for name, value in node.attrib.items() if name.startswith(rel_prefix)}
+
+def _replace_element_content(element, source):
+    element.attrib.clear()
+    element.attrib.update(source.attrib)
+    for child in list(element):
+        element.remove(child)
+    for child in list(source):
+        element.append(child)
+
+def restore_slide(slide, snapshot):
+    """
+    Put a snapshot_slide() of the same template slide back in place. Returns
+    False, leaving the slide untouched, when a relationship the snapshot refers
+    to does not exist here.
+    """
+    sld = parse_xml(snapshot["xml"])
+    if not _relationship_ids(sld) <= set(slide.part.rels.keys()):
+        return False
+    charts = []
+    for rId, chart in snapshot["charts"].items():
+        chart_part = slide.part.related_part(rId)
+        chart_space = parse_xml(chart["xml"])
+        if not _relationship_ids(chart_space) <= set(chart_part.rels.keys()):
+            return False
+        charts.append((chart_part, chart_space, chart["xlsx"]))
+
+    _replace_element_content(slide._element, sld)
+    for chart_part, chart_space, xlsx in charts:
+        _replace_element_content(chart_part._element, chart_space)
+        if xlsx is not None:
+            chart_part.related_part(chart_part._element.xlsx_part_rId).blob = base64.b64decode(xlsx)
+    return True
+
+# --------------- lazy placeholder values ---------------
+
+class PlaceholderResolver:
+    """
+    Placeholder values produced on demand for one run. Each producer is
+    registered under a name together with the template keys it fills; it runs
+    only when the template uses one of those keys (see CompiledTemplate), and
+    at most once per resolver, so one resolver per request memoizes them.
+    """
+
+    def __init__(self, template_keys):
+        self.template_keys = set(template_keys)
+        self._keys = OrderedDict()       # name -> keys the producer fills
+        self._producers = {}
+        self._values = {}
+
+    def register(self, name, keys, producer):
+        self._keys[name] = set(keys)
+        self._producers[name] = producer
+
+    def uses(self, *keys):
+        """True if the template references any of keys."""
+        return any(key in self.template_keys for key in keys)
+
+    def needed(self, name):
+        return self.uses(*self._keys[name])
+
+    def get(self, name, default=None):
+        """The producer's (memoized) value, or default if the template does not need it."""
+        if not self.needed(name):
+            return default
+        if name not in self._values:
+            self._values[name] = self._producers[name]()
+        return self._values[name]
+
+    def skipped(self):
+        """Registered producers the template never asked for."""
+        return [name for name in self._keys if not self.needed(name)]
+
+# --------------- pipeline metrics ---------------
+
+# JSON line per run: "" = off, "-" = stderr, anything else = file path (appended)
+METRICS_LOG = os.environ.get("PPT_CRAFTER_METRICS_LOG", "")
+_metrics_log_lock = threading.Lock()
+
+class PipelineMetrics:
+    """
+    Wall-clock seconds per pipeline stage for one main() run, plus a few counts
+    (AI calls, companies, slides, ...). Stages nest: time spent in an inner
+    stage (e.g. "ai" inside "workbook") is only counted for the inner one, so
+    the stages add up to roughly total_s. Not shared between runs.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.counts = {}
+        self.total = 0.0
+        self.error = None
+        self._nested = []
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    @property
+    def degraded(self):
+        """True when the deck was built with an empty AI section or blank company details."""
+        return bool(self.counts.get("ai_empty") or self.counts.get("companies_unresolved"))
+
+    def as_dict(self):
+        return {
+            "total_s": round(self.total, 4),
+            "stages_s": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "counts": dict(self.counts),
+            "degraded": self.degraded,
+            "error": self.error,
+        }
 
-def main(excel_file, ppt_template, output_ppt):
-    prs = Presentation(ppt_template)
+    def log(self, destination=None, **fields):
+        """Write the metrics as one JSON line (see METRICS_LOG); extra fields are included."""
+        destination = METRICS_LOG if destination is None else destination
+        if not destination:
+            return
+        line = json.dumps(dict(self.as_dict(), ts=round(time.time(), 3), **fields), default=str)
+        try:
+            with _metrics_log_lock:
+                if destination == "-":
+                    print(line, file=sys.stderr, flush=True)
+                else:
+                    with open(destination, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
+        except Exception as e:
+            print("⚠️ Failed to write metrics log:", e)
 
-    kv = read_summary_keys(excel_file, "Summary")
-    dynamic_kv, volumes = extract_dynamic_placeholders(excel_file, include_market_overview=True, include_overview_content=True)
-    kv.update(dynamic_kv)
-    kv["Subtitle"] = build_report_subtitle(excel_file)
+@contextmanager
+def pipeline_stage(metrics, name):
+    """metrics.stage(name), or nothing when no metrics are being collected."""
+    if metrics is None:
+        yield None
+    else:
+        with metrics.stage(name):
+            yield metrics
 
-    # Create inline versions of list placeholders
-    inline_kv = create_inline_placeholders(excel_file)
-    kv.update(inline_kv)
+# --------------- main ---------------
 
-    wb = openpyxl.load_workbook(excel_file, data_only=True)
-    list_placeholders = {}
-    for sheet_name in wb.sheetnames:
-        if sheet_name.startswith("By_"):
+def main(excel_file, ppt_template, output_ppt=None, metrics=None, incremental=None):
+    """
+    Build the report. excel_file and ppt_template may be paths, bytes or
+    file-like objects; output_ppt may be a path or a writable file-like object.
+    With output_ppt=None the deck is returned as an in-memory BytesIO.
+
+    incremental (default: INCREMENTAL_REGEN env, on) keeps a snapshot of every
+    slide rendered in place, with a hash of its inputs, under the report's
+    title; on the next run, slides whose inputs are unchanged are restored from
+    it instead of being rendered again.
+
+    Pass a PipelineMetrics as metrics to get the per-stage timings of this run
+    (filled in even when generation fails); they are also written to
+    METRICS_LOG when that is set.
+    """
+    metrics = PipelineMetrics() if metrics is None else metrics
+    started = time.perf_counter()
+    try:
+        return _generate(excel_file, ppt_template, output_ppt, metrics, incremental)
+    except Exception as e:
+        metrics.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        metrics.total = time.perf_counter() - started
+        metrics.log(excel=excel_file if isinstance(excel_file, (str, os.PathLike)) else None)
+
+def _generate(excel_file, ppt_template, output_ppt, metrics, incremental):
+    if incremental is None:
+        incremental = os.environ.get("INCREMENTAL_REGEN", "1") not in ("0", "false", "no")
+
+    # Parsed template + slide locations are cached by content hash; work on a copy
+    with metrics.stage("template"):
+        template = compile_template(ppt_template)
+        prs = template.new_presentation()
+
+    # Only values for placeholders the template actually contains are produced
+    resolver = PlaceholderResolver(template.placeholder_slides)
+
+    # Parse the datasheet once; every extractor below shares this context
+    with WorkbookContext(excel_file) as wb:
+        resolver.register("subtitle", ["Subtitle"], lambda: {"Subtitle": build_report_subtitle(wb)})
+        inline_keys = [f"{sheet_name}_Inline" for sheet_name in ("By_Type", "By_Application", "By_EndUser", "By_Region")]
+        resolver.register("inline", inline_keys, lambda: create_inline_placeholders(wb))
+        list_sheets = [sheet_name for sheet_name in wb.sheetnames if sheet_name.startswith("By_")]
+        for sheet_name in list_sheets:
             key = sheet_name + "_List"
-            items = build_list_from_sheet(excel_file, sheet_name)
-            list_placeholders[key] = items
+            resolver.register(key, [key, key + "_EXPAND"],
+                              lambda sheet_name=sheet_name: build_list_from_sheet(wb, sheet_name))
+        resolver.register("toc", ["Table_Contents_Left", "Table_Contents_Right"],
+                          lambda: build_toc_from_sheet(wb, "Table_Contents"))
+        resolver.register("companies", ["Company_Name_List"], lambda: build_list_from_sheet(wb, "Company_Name"))
+
+        with metrics.stage("workbook"):
+            kv = read_summary_keys(wb, "Summary")
+            dynamic_kv, volumes = extract_dynamic_placeholders(wb, include_market_overview=False,
+                                                               include_overview_content=False, metrics=metrics)
+            # Gemini runs later, and only for AI sections shown on a slide that is not restored
+            ai_prompts = build_ai_prompts(wb, dynamic_kv, [key for key in AI_SECTION_KEYS if resolver.uses(key)])
+            resolver.register("ai", AI_SECTION_KEYS, lambda: generate_ai_sections(ai_prompts, metrics))
+            kv.update(dynamic_kv)
+            kv.update(resolver.get("subtitle", {}))
+
+            # Create inline versions of list placeholders
+            kv.update(resolver.get("inline", {}))
+
+            list_placeholders = {}
+            for sheet_name in list_sheets:
+                key = sheet_name + "_List"
+                if resolver.needed(key):
+                    list_placeholders[key] = resolver.get(key)
+
+            toc_items = resolver.get("toc", [])
+            company_items = resolver.get("companies", [])
+
+        # Slides whose inputs match the previous run of this report are copied from its output
+        reused = set()
+        if incremental:
+            with metrics.stage("state"):
+                state_key = report_state_key(template, wb.value("Summary", 2, 2))
+                signatures = slide_input_signatures(template, wb, kv, list_placeholders, volumes,
+                                                    deferred={key: prompt_fingerprint(prompt)
+                                                              for key, (prompt, _) in ai_prompts.items()})
+                previous = REPORT_STATE.get(state_key) or {}
+                for slide_id, signature in signatures.items():
+                    entry = previous.get(slide_id)
+                    slide = template.slide(prs, int(slide_id))
+                    if not entry or entry["signature"] != signature or slide is None:
+                        continue
+                    try:
+                        if restore_slide(slide, entry["snapshot"]):
+                            reused.add(int(slide_id))
+                    except Exception as e:
+                        print(f"⚠️ Could not restore slide {slide_id} from the previous run: {e}")
+                metrics.count("slides_reused", len(reused))
+                print(f"Incremental: {len(reused)} of {len(signatures)} slides reused from the previous run")
+
+        if any(slide_id not in reused for key in ai_prompts for slide_id in template.placeholder_slides.get(key, [])):
+            kv.update(resolver.get("ai", {}))
+
+        if resolver.needed("toc"):
+            with metrics.stage("toc"):
+                handle_toc_multi_slides(prs, toc_items, toc_template=template.slide(prs, template.toc_slide_id))
+                metrics.count("toc_items", len(toc_items))
+
+        # Find every {{...}} token once; passes below only visit indexed slides/paragraphs
+        with metrics.stage("text"):
+            index = PlaceholderIndex(prs)
+
+        # Process all slides for replacements
+        for slide in prs.slides:
+            slide_keys = index.keys_on(slide)
+            if not slide_keys or slide.slide_id in reused:
+                continue
+
+            slide_lists = {key: items for key, items in list_placeholders.items()
+                           if key in slide_keys or key + "_EXPAND" in slide_keys}
+            if slide_lists:
+                # *** ENHANCED: Use the new enhanced table processing function ***
+                with metrics.stage("tables"):
+                    process_table_placeholders_with_expansion_enhanced(slide, slide_lists, wb)
+            
+                # Regular bulleted lists (for text frames, not tables)
+                with metrics.stage("lists"):
+                    for key, items in slide_lists.items():
+                        placeholder = "{{" + key + "}}"
+                        if items and key in slide_keys:
+                            # Only process non-table placeholders here
+                            replace_list_placeholder_in_slide(slide, placeholder, items)
+
+                    # rows/paragraphs/boxes were added: refresh this slide's hits
+                    index.rescan_slide(slide)
+
+            # Text placeholders (includes inline keys)
+            with metrics.stage("text"):
+                replace_indexed_text_placeholders(index, slide, kv)
+
+        # 🔽🔽🔽 NEW CODE BLOCK TO UPDATE CHARTS 🔽🔽🔽
+        with metrics.stage("charts"):
+            historical_years = list(range(2019, 2025))
+            forecast_years = list(range(2025, 2034))
+            for slide_id in template.chart_slide_ids:
+                slide = template.slide(prs, slide_id)
+                if slide is not None and slide_id not in reused:
+                    update_charts_in_slide(slide, volumes, kv["Unit"], historical_years, forecast_years)
+        # 🔼🔼🔼 END OF NEW BLOCK 🔼🔼🔼
+
+        # Company table placeholders (details come through COMPANY_CACHE)
+        if resolver.needed("companies"):
+            with metrics.stage("enrich"):
+                company_details = enrich_companies(company_items, use_ai=True, metrics=metrics)
+                metrics.count("companies", len(company_items))
+            with metrics.stage("company_tables"):
+                distribute_company_names_across_template_slides(prs, "{{Company_Name_List}}", company_items,
+                                                                duplicate_if_needed=True,
+                                                                slides=index.slides_with("Company_Name_List"),
+                                                                company_details=company_details)
+        skipped = resolver.skipped()
+        if skipped:
+            print(f"Skipped values the template has no placeholders for: {skipped}")
+
+        if incremental:
+            with metrics.stage("state"):
+                try:
+                    slides = {}
+                    # a failed AI section must not be restored on the next run
+                    ai_failed = {key for key in ai_prompts if not kv.get(key)}
+                    for slide_id, signature in signatures.items():
+                        slide = template.slide(prs, int(slide_id))
+                        if int(slide_id) in reused:
+                            slides[slide_id] = previous[slide_id]
+                        elif slide is not None and not ai_failed & set(template.slide_keys.get(int(slide_id), [])):
+                            slides[slide_id] = {"signature": signature, "snapshot": snapshot_slide(slide)}
+                    REPORT_STATE.set(state_key, slides)
+                except Exception as e:
+                    print("⚠️ Failed to record slides for the next run:", e)
+
+    metrics.count("slides", len(prs.slides))
+    with metrics.stage("save"):
+        if output_ppt is None:
+            output_ppt = io.BytesIO()
+            prs.save(output_ppt)
+            output_ppt.seek(0)
+        else:
+            prs.save(output_ppt)
+    print("Saved:", output_ppt if isinstance(output_ppt, (str, os.PathLike)) else type(output_ppt).__name__)
+    return output_ppt
 
-    toc_items = build_toc_from_sheet(excel_file, "Table_Contents")
-    handle_toc_multi_slides(prs, toc_items)
+# --------------- batch mode ---------------
 
-    # Process all slides for replacements
-    for slide in prs.slides:
-        
-        # *** ENHANCED: Use the new enhanced table processing function ***
-        process_table_placeholders_with_expansion_enhanced(slide, list_placeholders, excel_file)
-        
-        # Regular bulleted lists (for text frames, not tables)
-        for key, items in list_placeholders.items():
-            placeholder = "{{" + key + "}}"
-            if items:
-                # Only process non-table placeholders here
-                replace_list_placeholder_in_slide(slide, placeholder, items)
-
-        # Text placeholders (includes inline keys)
-        for key, val in kv.items():
-            placeholder = "{{" + key + "}}"
-            replace_text_placeholders_in_slide(slide, placeholder, val if val else "")
-
-    # 🔽🔽🔽 NEW CODE BLOCK TO UPDATE CHARTS 🔽🔽🔽
-    historical_years = list(range(2019, 2025))
-    forecast_years = list(range(2025, 2034))
-    for slide in prs.slides:
-        update_charts_in_slide(slide, volumes, kv["Unit"], historical_years, forecast_years)
-    # 🔼🔼🔼 END OF NEW BLOCK 🔼🔼🔼
+def _batch_worker_init(ppt_template, verbose):
+    """Process-pool initializer: compile the template once per worker."""
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    compile_template(ppt_template)
+
+def _batch_generate(excel_file, ppt_template, output_ppt):
+    started = time.perf_counter()
+    try:
+        main(excel_file, ppt_template, output_ppt)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return excel_file, output_ppt, time.perf_counter() - started, error
 
-    # Company table placeholders
-    company_items = build_list_from_sheet(excel_file, "Company_Name")
-    distribute_company_names_across_template_slides(prs, "{{Company_Name_List}}", company_items, duplicate_if_needed=True)
+def read_batch_manifest(path):
+    """
+    Datasheets listed in a manifest: one per line as "excel.xlsx" or
+    "excel.xlsx,output.pptx" (relative paths are relative to the manifest).
+    Blank lines and # comments are skipped.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = [part.strip() for part in line.split(",")]
+            excel = os.path.join(base, parts[0])
+            output = os.path.join(base, parts[1]) if len(parts) > 1 and parts[1] else None
+            jobs.append((excel, output))
+    return jobs
+
+def run_batch(jobs, ppt_template, out_dir, workers=None, verbose=False):
+    """
+    Generate one deck per (excel, output or None) job on a process pool. Each
+    worker parses the template once; the company/AI caches are shared through
+    the SQLite store. Jobs that would write the same output file get a -2, -3,
+    ... suffix instead. Prints a throughput summary and returns
+    [(excel, output, seconds, error), ...].
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    os.makedirs(out_dir, exist_ok=True)
+    ppt_template = os.path.abspath(ppt_template)
+    planned = []
+    taken = set()
+    for excel, output in jobs:
+        if output is None:
+            output = os.path.join(out_dir, os.path.splitext(os.path.basename(excel))[0] + ".pptx")
+        # one job per output file, so two workers never write the same deck
+        stem, ext = os.path.splitext(output)
+        candidate, n = output, 1
+        while os.path.normcase(os.path.abspath(candidate)) in taken:
+            n += 1
+            candidate = f"{stem}-{n}{ext}"
+        if candidate != output:
+            print(f"Output {output} is already used by another job; {os.path.basename(excel)} -> {candidate}")
+        taken.add(os.path.normcase(os.path.abspath(candidate)))
+        planned.append((excel, candidate))
+
+    workers = workers or os.cpu_count() or 1
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(planned))), initializer=_batch_worker_init,
+                             initargs=(ppt_template, verbose)) as pool:
+        futures = [pool.submit(_batch_generate, excel, ppt_template, output) for excel, output in planned]
+        for future in as_completed(futures):
+            excel, output, seconds, error = future.result()
+            results.append((excel, output, seconds, error))
+            status = f"FAILED ({error})" if error else f"{seconds:.1f}s"
+            print(f"[{len(results)}/{len(planned)}] {os.path.basename(excel)} -> {output}: {status}")
+        # measured before pool shutdown, which only waits on leftover background lookups
+        print_batch_summary(results, time.perf_counter() - started)
+    return results
+
+def print_batch_summary(results, wall_seconds):
+    ok = [seconds for _, _, seconds, error in results if not error]
+    failed = len(results) - len(ok)
+    print(f"\nBatch done: {len(ok)} deck(s) generated, {failed} failed, in {wall_seconds:.1f}s")
+    if ok:
+        p50, p95 = np.percentile(ok, [50, 95])
+        print(f"Throughput: {len(ok) / wall_seconds * 60:.1f} decks/min; per deck p50 {p50:.1f}s, p95 {p95:.1f}s")
+
+def _batch_cli(argv):
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(prog="generate_poc.py batch",
+                                     description="Generate many decks from datasheets with one template.")
+    parser.add_argument("inputs", nargs="*", help="datasheet files or directories of .xlsx files")
+    parser.add_argument("-t", "--template", required=True, help="PPTX template used for every deck")
+    parser.add_argument("-o", "--out-dir", default="decks", help="output directory (default: decks)")
+    parser.add_argument("-m", "--manifest", help="manifest file: one 'excel[,output]' per line")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show generator output from workers")
+    args = parser.parse_args(argv)
+
+    jobs = read_batch_manifest(args.manifest) if args.manifest else []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            jobs.extend((excel, None) for excel in sorted(glob.glob(os.path.join(path, "*.xlsx"))))
+        else:
+            jobs.append((path, None))
+    if not jobs:
+        parser.error("no datasheets given (pass files, a directory or --manifest)")
 
-    prs.save(output_ppt)
-    print("Saved:", output_ppt)
+    results = run_batch(jobs, args.template, args.out_dir, workers=args.workers, verbose=args.verbose)
+    return 1 if any(error for *_, error in results) else 0
 
 if __name__ == "__main__":
-    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(_batch_cli(sys.argv[2:]))
+
     if len(sys.argv) == 4:
         excel_file, ppt_template, output_ppt = sys.argv[1], sys.argv[2], sys.argv[3]
     else:
@@ -0,0 +1,21 @@
+# Production server settings: gunicorn -c gunicorn.conf.py index:app
+import gc
+import os
+
+# Load index (and, in when_ready, the generator + default template) once in the
+# master; workers are forked warm and share those pages copy-on-write.
+preload_app = True
+
+# One worker unless WEB_CONCURRENCY says otherwise: each worker holds its own
+# template cache, workbooks and NumPy arrays, and inside a container the CPU
+# count is the host's, not the instance's. Raise it on instances with the
+# memory for it (a worker peaks around 150 MB on a small deck).
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_class = "sync"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "400"))
+
+def when_ready(server):
+    from index import warm_up
+    warm_up()
+    # keep the preloaded objects out of the collector so it doesn't dirty shared pages
+    gc.freeze()
@@ -1,12 +1,19 @@
-import io
 import os
-import sys
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
 import tempfile
 import shutil
 import uuid
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from flask import Flask, request, send_file, make_response
+from flask import Flask, Response, request, send_file, make_response
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -18,6 +25,428 @@ CORS(app, resources={r"/*": {"origins": [
 # Path to default template in repo (adjust if your layout differs)
 DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "api", "default_template.pptx")
 
+PPTX_MIMETYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+# Generated decks up to this size stay in memory; bigger ones spill to an anonymous temp file
+OUTPUT_SPOOL_MAX_BYTES = int(os.environ.get("OUTPUT_SPOOL_MAX_MB", "8")) * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def _stream_pptx(fileobj, download_name="updated_poc.pptx"):
+    """
+    Chunked response for a generated deck held in a seekable file object, with
+    Content-Length, plus Range/If-Range handling on GET/HEAD requests.
+    The file is closed with the response.
+    """
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+
+    response = Response(
+        wrap_file(request.environ, fileobj, buffer_size=STREAM_CHUNK_BYTES),
+        mimetype=PPTX_MIMETYPE,
+        direct_passthrough=True,
+    )
+    response.content_length = size
+    response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=size)
+
+# --- Metrics store: counters and histograms shared by every worker process on the host ---
+METRICS_DB_PATH = os.environ.get("METRICS_DB", os.path.join(tempfile.gettempdir(), "ppt_crafter_metrics.sqlite3"))
+
+class MetricsStore:
+    """
+    SQLite file holding counters and histogram series. Every gunicorn worker
+    writes to the same file, so any worker answers /metrics and
+    /api/cache/stats for all of them. An empty path disables recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+                conn.execute("CREATE TABLE IF NOT EXISTS histogram_buckets (name TEXT, labels TEXT, le TEXT, "
+                             "count INTEGER, PRIMARY KEY (name, labels, le))")
+                conn.execute("CREATE TABLE IF NOT EXISTS histogram_sums (name TEXT, labels TEXT, sum REAL, "
+                             "PRIMARY KEY (name, labels))")
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def write(self, statements):
+        """Run [(sql, params), ...] in one transaction."""
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            try:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print("=== WARNING: Metrics write failed ===", e)
+
+    def read(self, sql, params=()):
+        if not self.path:
+            return []
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print("=== WARNING: Metrics read failed ===", e)
+            return []
+
+    def increment(self, name, amount=1):
+        self.write([("INSERT INTO counters VALUES (?, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))])
+
+    def counters(self, *names):
+        rows = self.read(f"SELECT name, value FROM counters WHERE name IN ({','.join('?' * len(names))})", names)
+        values = dict.fromkeys(names, 0)
+        values.update(rows)
+        return values
+
+metrics_store = MetricsStore(METRICS_DB_PATH)
+
+# --- Result cache: identical inputs return the stored deck without re-running the pipeline ---
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ppt_crafter_results"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+class ResultCache:
+    """
+    Content-addressed store of generated decks on local disk, one <key>.pptx per
+    result. Entries are evicted least recently used first (mtime is bumped on
+    every hit) once the directory grows past max_bytes. Hit/miss counters live
+    in the metrics store, so they add up across worker processes.
+    """
+
+    def __init__(self, directory, max_bytes, store):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.store = store
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pptx")
+
+    def get(self, key):
+        """
+        The cached deck for key as an open binary file, or None. The file is
+        opened here so an eviction right after the lookup can't remove it from
+        under the caller (the open handle keeps the data readable).
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.store.increment("result_cache_misses")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted just now; the open handle still reads it
+        self.store.increment("result_cache_hits")
+        return f
+
+    def put(self, key, fileobj):
+        """Store the deck in fileobj (read from the start) under key."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(f"{key}.{uuid.uuid4().hex}.tmp")
+        fileobj.seek(0)
+        with open(tmp, "wb") as f:
+            shutil.copyfileobj(fileobj, f, STREAM_CHUNK_BYTES)
+        os.replace(tmp, self._path(key))
+        fileobj.seek(0)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pptx"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        counters = self.store.counters("result_cache_hits", "result_cache_misses")
+        hits, misses = counters["result_cache_hits"], counters["result_cache_misses"]
+        lookups = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, metrics_store)
+
+def _sha256_of(fileobj):
+    """SHA-256 of a seekable upload stream; the stream is rewound afterwards."""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(STREAM_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+_default_template_sha = {}
+
+def _template_sha(ppt):
+    if ppt and ppt.filename:
+        return _sha256_of(ppt.stream)
+    # default template: hash once per (mtime, size)
+    st = os.stat(DEFAULT_TEMPLATE_PATH)
+    stamp = (st.st_mtime, st.st_size)
+    if _default_template_sha.get("stamp") != stamp:
+        with open(DEFAULT_TEMPLATE_PATH, "rb") as f:
+            _default_template_sha.update(stamp=stamp, sha=_sha256_of(f))
+    return _default_template_sha["sha"]
+
+_generator_sha = []
+
+def _generator_options():
+    """Everything besides the two uploads that changes the generated deck."""
+    if not _generator_sha:
+        # code only changes with a deploy, i.e. a new process
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_poc.py"), "rb") as f:
+            _generator_sha.append(_sha256_of(f))
+    return {
+        "generator": _generator_sha[0],
+        "ai": bool(os.environ.get("GENAI_API_KEY")),
+        "fake_ai": bool(os.environ.get("GENAI_FAKE")),
+    }
+
+def _result_key(excel, ppt):
+    parts = [_sha256_of(excel.stream), _template_sha(ppt), json.dumps(_generator_options(), sort_keys=True)]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+def _wants_refresh():
+    """refresh=1 (form field or query) bypasses the result cache."""
+    return request.values.get("refresh", "").lower() in ("1", "true", "yes")
+
+# --- Metrics: per-stage generation timings as Prometheus-style histograms ---
+METRIC_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Histograms:
+    """
+    Cumulative histograms in the Prometheus text format. Series are kept in the
+    metrics store, so every worker process adds to, and renders, the same ones.
+    """
+
+    def __init__(self, buckets, store):
+        self.buckets = buckets
+        self.store = store
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, seconds, **labels):
+        label_text = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+        statements = [("INSERT INTO histogram_buckets VALUES (?, ?, ?, 1) "
+                       "ON CONFLICT(name, labels, le) DO UPDATE SET count = count + 1", (name, label_text, str(le)))
+                      for le in [bound for bound in self.buckets if seconds <= bound] + ["+Inf"]]
+        statements.append(("INSERT INTO histogram_sums VALUES (?, ?, ?) "
+                           "ON CONFLICT(name, labels) DO UPDATE SET sum = sum + excluded.sum",
+                           (name, label_text, seconds)))
+        self.store.write(statements)
+
+    def render(self):
+        series = {}  # (name, label text) -> {le: count}
+        for name, label_text, le, count in self.store.read("SELECT name, labels, le, count FROM histogram_buckets"):
+            series.setdefault((name, label_text), {})[le] = count
+        sums = {(name, label_text): total for name, label_text, total
+                in self.store.read("SELECT name, labels, sum FROM histogram_sums")}
+        lines = []
+        described = set()
+        for (name, label_text), counts in sorted(series.items()):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            for le in [str(bound) for bound in self.buckets] + ["+Inf"]:
+                lines.append(f'{name}_bucket{{{label_text + "," if label_text else ""}le="{le}"}} {counts.get(le, 0)}')
+            suffix = "{" + label_text + "}" if label_text else ""
+            lines.append(f"{name}_sum{suffix} {sums.get((name, label_text), 0.0):.6f}")
+            lines.append(f"{name}_count{suffix} {counts.get('+Inf', 0)}")
+        return "\n".join(lines) + "\n"
+
+histograms = Histograms(METRIC_BUCKETS, metrics_store)
+histograms.describe("ppt_crafter_request_seconds", "Time to answer a deck generation request.")
+histograms.describe("ppt_crafter_generation_seconds", "Generator run time (result cache misses only).")
+histograms.describe("ppt_crafter_stage_seconds", "Generator time per pipeline stage.")
+
+def _record_generation(metrics, source):
+    """Feed one generator run (a generate_poc.PipelineMetrics) into the histograms."""
+    outcome = "error" if metrics.error else "ok"
+    histograms.observe("ppt_crafter_generation_seconds", metrics.total, source=source, outcome=outcome)
+    for stage, seconds in metrics.stages.items():
+        histograms.observe("ppt_crafter_stage_seconds", seconds, stage=stage)
+
+def _server_timing(metrics):
+    """Server-Timing header value for a generator run, e.g. 'ai;dur=812.4, save;dur=40.1, total;dur=1203.7'."""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in metrics.stages.items()]
+    parts.append(f"total;dur={metrics.total * 1000:.1f}")
+    return ", ".join(parts)
+
+# --- Async jobs: state lives on local disk so any worker process can answer status/result ---
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(tempfile.gettempdir(), "ppt_crafter_jobs"))
+# Jobs run in a process pool per web worker, so CPU-bound generation doesn't hold the
+# GIL against request handling. Each job process costs about as much memory as a web
+# worker. A job still running when its web worker exits is lost and later expires.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "3600"))
+_job_executor = []   # the pool, created on first use: never in the gunicorn master
+_job_executor_lock = threading.Lock()
+
+def _submit_job(*args):
+    """Run _run_job(*args) in the job process pool, replacing the pool if a child died."""
+    with _job_executor_lock:
+        for _ in range(2):
+            if not _job_executor:
+                _job_executor.append(ProcessPoolExecutor(max_workers=JOB_WORKERS))
+            try:
+                return _job_executor[0].submit(_run_job, *args)
+            except BrokenProcessPool:
+                _job_executor.pop().shutdown(wait=False)
+        raise RuntimeError("Job process pool keeps failing")
+
+def _with_origin(resp):
+    resp.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
+    return resp
+
+def _validated_uploads():
+    """(excel, template, None) from the request files, or (None, None, error response)."""
+    if "excel" not in request.files:
+        return None, None, ("Missing file: need 'excel'", 400)
+
+    excel = request.files["excel"]
+    ppt   = request.files.get("template")
+
+    if not excel.filename.lower().endswith((".xlsx", ".xls")):
+        return None, None, ("Excel must be .xlsx or .xls", 400)
+    if ppt and ppt.filename and not ppt.filename.lower().endswith(".pptx"):
+        return None, None, ("Template must be .pptx", 400)
+
+    if (not ppt or not ppt.filename) and not os.path.exists(DEFAULT_TEMPLATE_PATH):
+        return None, None, ("Server template missing. Please add api/default_template.pptx to the repo.", 500)
+    return excel, ppt, None
+
+def _job_dir(job_id):
+    # job ids are uuid4 hex; anything else never touches the filesystem
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+        return None
+    return os.path.join(JOBS_DIR, job_id)
+
+def _read_job(job_id):
+    job_dir = _job_dir(job_id)
+    if not job_dir:
+        return None
+    try:
+        with open(os.path.join(job_dir, "job.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_job(job_id, **fields):
+    job_dir = _job_dir(job_id)
+    job = _read_job(job_id) or {"job_id": job_id, "created": time.time()}
+    job.update(fields, updated=time.time())
+    tmp = os.path.join(job_dir, f"job.json.{uuid.uuid4().hex}")
+    with open(tmp, "w") as f:
+        json.dump(job, f)
+    os.replace(tmp, os.path.join(job_dir, "job.json"))  # atomic: readers never see half a file
+    return job
+
+def _expire_job(job_id, job):
+    """
+    A queued/running job untouched for JOB_TTL_SECONDS was lost with its
+    worker (restart, crash) or waited too long: mark it as an error so pollers
+    stop waiting. Returns the job as it now stands.
+    """
+    if job and job.get("status") in ("queued", "running") and job.get("updated", 0) < time.time() - JOB_TTL_SECONDS:
+        job = _write_job(job_id, status="error", error=f"Job expired while {job.get('status')}")
+    return job
+
+JOB_PRUNE_INTERVAL = 60
+_last_prune = [0.0]
+
+def _prune_jobs():
+    """
+    Expire stale queued/running jobs and remove finished job dirs older than
+    JOB_TTL_SECONDS. Runs at most once per JOB_PRUNE_INTERVAL per process.
+    """
+    now = time.time()
+    if now - _last_prune[0] < JOB_PRUNE_INTERVAL or not os.path.isdir(JOBS_DIR):
+        return
+    _last_prune[0] = now
+    for name in os.listdir(JOBS_DIR):
+        job = _expire_job(name, _read_job(name))
+        if job and job.get("status") in ("done", "error") and job.get("updated", 0) < now - JOB_TTL_SECONDS:
+            shutil.rmtree(os.path.join(JOBS_DIR, name), ignore_errors=True)
+
+def _run_job(job_id, excel_path, ppt_path, out_path, cache_key=None):
+    # the job may have expired (or been pruned) while it waited in the executor
+    job = _expire_job(job_id, _read_job(job_id))
+    if not job or job.get("status") != "queued":
+        print("=== DEBUG: Skipping expired job", job_id)
+        return
+    _write_job(job_id, status="running")
+    metrics = None
+    try:
+        from generate_poc import main as generate_main, PipelineMetrics
+        metrics = PipelineMetrics()
+        try:
+            generate_main(excel_path, ppt_path, out_path, metrics=metrics)
+        finally:
+            _record_generation(metrics, "job")
+        if not os.path.exists(out_path):
+            raise RuntimeError("Output PPTX not found after generator run")
+        if cache_key and not metrics.degraded:
+            with open(out_path, "rb") as f:
+                result_cache.put(cache_key, f)
+        if (_read_job(job_id) or {}).get("status") != "running":
+            return  # expired while running: keep the error pollers were already given
+        _write_job(job_id, status="done", metrics=metrics.as_dict())
+    except Exception as e:
+        print(f"=== ERROR in job {job_id} ===")
+        print(traceback.format_exc())
+        _write_job(job_id, status="error", error=str(e), metrics=metrics.as_dict() if metrics else None)
+
+def warm_up():
+    """
+    Import the generator and compile the default template. Run once in the gunicorn
+    master (see gunicorn.conf.py) so forked workers share it copy-on-write instead
+    of paying the import on their first request.
+    """
+    try:
+        import generate_poc
+        if os.path.exists(DEFAULT_TEMPLATE_PATH):
+            generate_poc.compile_template(DEFAULT_TEMPLATE_PATH)
+        print("=== DEBUG: Generator preloaded ===")
+    except Exception as e:
+        # workers fall back to importing lazily on first request
+        print("=== WARNING: Generator preload failed ===", e)
+
 # --- Health check ---
 @app.get("/")
 def health_root():
@@ -29,92 +458,153 @@ def generate():
     try:
         # CORS preflight
         if request.method == "OPTIONS":
-            resp = make_response()
-            resp.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
+            resp = _with_origin(make_response())
             resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
             resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
             return resp, 200
 
-        if "excel" not in request.files:
-            return ("Missing file: need 'excel'", 400)
-
-        excel = request.files["excel"]
-        ppt   = request.files.get("template")
+        excel, ppt, error = _validated_uploads()
+        if error:
+            return error
 
-        if not excel.filename.lower().endswith((".xlsx", ".xls")):
-            return ("Excel must be .xlsx or .xls", 400)
-        if ppt and ppt.filename and not ppt.filename.lower().endswith(".pptx"):
-            return ("Template must be .pptx", 400)
+        started = time.perf_counter()
+        cache_key = _result_key(excel, ppt)
+        cached = None if _wants_refresh() else result_cache.get(cache_key)
+        if cached:
+            print("=== DEBUG: Result cache hit", cache_key)
+            response = _stream_pptx(cached)
+            response.headers["X-Result-Cache"] = "hit"
+            histograms.observe("ppt_crafter_request_seconds", time.perf_counter() - started, cache="hit")
+            return _with_origin(response)
 
-        if (not ppt or not ppt.filename) and not os.path.exists(DEFAULT_TEMPLATE_PATH):
-            return ("Server template missing. Please add api/default_template.pptx to the repo.", 500)
+        # Uploads go straight from the request streams into the generator; nothing touches disk
+        if ppt and ppt.filename:
+            template = ppt.stream
+            print("=== DEBUG: Using uploaded template")
+        else:
+            # the generator caches the compiled default template by hash
+            template = DEFAULT_TEMPLATE_PATH
+            print("=== DEBUG: Using default template", template)
 
-        work = os.path.join(tempfile.gettempdir(), f"imarc_{uuid.uuid4().hex}")
-        os.makedirs(work, exist_ok=True)
-        print("=== DEBUG: Work dir created:", work)
+        # --- Direct call: import and run the generator function ---
+        try:
+            # Import here in case the generator was not preloaded (see warm_up)
+            from generate_poc import main as generate_main, PipelineMetrics
+        except Exception as e:
+            print("=== ERROR importing generate_poc ===", e)
+            return _with_origin(make_response(f"Failed to import generator: {e}", 500))
 
+        # The zip writer saves into a spooled file, which is then streamed in chunks
+        output = tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MAX_BYTES)
+        metrics = PipelineMetrics()
         try:
-            excel_path = os.path.join(work, "datasheet_imarc.xlsx")
-            ppt_path   = os.path.join(work, "template.pptx")
-            out_path   = os.path.join(work, "updated_poc.pptx")
+            generate_main(excel.stream, template, output, metrics=metrics)
+        except Exception as e:
+            output.close()
+            _record_generation(metrics, "api")
+            tb = traceback.format_exc()
+            print("=== ERROR running generate_main ===")
+            print(tb)
+            return _with_origin(make_response(f"Generator raised an exception:\n\n{tb}", 500))
 
-            excel.save(excel_path)
-            print("=== DEBUG: Excel saved at", excel_path)
+        if metrics.degraded:
+            # an AI section or company lookup failed: let the next request try again
+            print("=== DEBUG: Degraded result not cached", json.dumps(metrics.counts))
+        else:
+            try:
+                result_cache.put(cache_key, output)
+            except OSError as e:
+                print("=== DEBUG: Failed to store result in cache:", e)
 
-            if ppt and ppt.filename:
-                ppt.save(ppt_path)
-                print("=== DEBUG: Custom template saved at", ppt_path)
-            else:
-                shutil.copyfile(DEFAULT_TEMPLATE_PATH, ppt_path)
-                print("=== DEBUG: Default template copied at", ppt_path)
+        _record_generation(metrics, "api")
+        print("=== DEBUG: Generation timings", json.dumps(metrics.as_dict()))
 
-            # --- Direct call: import and run the generator function ---
-            try:
-                # Import here so top-level imports in generate_poc don't run before temp files are ready
-                from generate_poc import main as generate_main
-            except Exception as e:
-                print("=== ERROR importing generate_poc ===", e)
-                resp = make_response(f"Failed to import generator: {e}", 500)
-                resp.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
-                return resp
+        response = _stream_pptx(output)
+        response.headers["X-Result-Cache"] = "miss"
+        response.headers["Server-Timing"] = _server_timing(metrics)
+        histograms.observe("ppt_crafter_request_seconds", time.perf_counter() - started, cache="miss")
+        return _with_origin(response)
 
-            try:
-                # Call generator with full absolute paths
-                generate_main(excel_path, ppt_path, out_path)
-            except Exception as e:
-                tb = traceback.format_exc()
-                print("=== ERROR running generate_main ===")
-                print(tb)
-                resp = make_response(f"Generator raised an exception:\n\n{tb}", 500)
-                resp.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
-                return resp
-
-            if not os.path.exists(out_path):
-                print("=== DEBUG: Output file not found after generator run ===")
-                resp = make_response("Output PPTX not found (expected 'updated_poc.pptx')", 500)
-                resp.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
-                return resp
+    except Exception as e:
+        print("=== EXCEPTION in /api ===")
+        print(traceback.format_exc())
+        return (f"Exception: {str(e)}", 500)
 
-            with open(out_path, "rb") as f:
-                data = f.read()
+# --- Async job endpoints ---
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    """Queue a generation and return its id at once (202); poll /api/jobs/<id>."""
+    try:
+        excel, ppt, error = _validated_uploads()
+        if error:
+            return error
 
-            response = send_file(
-                io.BytesIO(data),
-                mimetype="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                as_attachment=True,
-                download_name="updated_poc.pptx",
-            )
-            response.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
-            return response
+        _prune_jobs()
+        job_id = uuid.uuid4().hex
+        work = _job_dir(job_id)
+        os.makedirs(work, exist_ok=True)
 
-        finally:
-            try:
-                shutil.rmtree(work)
-                print("=== DEBUG: Work dir cleaned ===")
-            except Exception as e:
-                print("=== DEBUG: Failed to clean work dir:", e)
+        excel_path = os.path.join(work, "datasheet_imarc.xlsx")
+        out_path   = os.path.join(work, "updated_poc.pptx")
+
+        cache_key = _result_key(excel, ppt)
+        cached = None if _wants_refresh() else result_cache.get(cache_key)
+        if cached:
+            # same inputs as an earlier run: the job is done before it starts
+            with cached, open(out_path, "wb") as f:
+                shutil.copyfileobj(cached, f, STREAM_CHUNK_BYTES)
+            job = _write_job(job_id, status="done", cached=True)
+            resp = make_response(dict(job, status_url=f"/api/jobs/{job_id}", result_url=f"/api/jobs/{job_id}/result"), 202)
+            return _with_origin(resp)
+
+        excel.save(excel_path)
+        if ppt and ppt.filename:
+            ppt_path = os.path.join(work, "template.pptx")
+            ppt.save(ppt_path)
+        else:
+            ppt_path = DEFAULT_TEMPLATE_PATH
+
+        job = _write_job(job_id, status="queued")
+        _submit_job(job_id, excel_path, ppt_path, out_path, cache_key)
+        print("=== DEBUG: Job queued:", job_id)
+
+        resp = make_response(dict(job, status_url=f"/api/jobs/{job_id}", result_url=f"/api/jobs/{job_id}/result"), 202)
+        return _with_origin(resp)
 
     except Exception as e:
-        print("=== EXCEPTION in /api ===")
+        print("=== EXCEPTION in /api/jobs ===")
         print(traceback.format_exc())
-        return (f"Exception: {str(e)}", 500)
\ No newline at end of file
+        return (f"Exception: {str(e)}", 500)
+
+@app.get("/api/jobs/<job_id>")
+def job_status(job_id):
+    _prune_jobs()
+    job = _expire_job(job_id, _read_job(job_id))
+    if not job:
+        return _with_origin(make_response({"error": "unknown job"}, 404))
+    return _with_origin(make_response(job, 200))
+
+@app.get("/api/jobs/<job_id>/result")
+def job_result(job_id):
+    job = _read_job(job_id)
+    if not job:
+        return _with_origin(make_response({"error": "unknown job"}, 404))
+    if job.get("status") != "done":
+        return _with_origin(make_response(job, 409))
+
+    response = send_file(
+        os.path.join(_job_dir(job_id), "updated_poc.pptx"),
+        mimetype=PPTX_MIMETYPE,
+        as_attachment=True,
+        download_name="updated_poc.pptx",
+    )
+    return _with_origin(response)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return _with_origin(make_response(result_cache.stats(), 200))
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target: request, generation and per-stage histograms of all workers."""
+    return Response(histograms.render(), mimetype="text/plain; version=0.0.4")